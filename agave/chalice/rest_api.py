@@ -1,9 +1,16 @@
+import logging
 import mimetypes
-from typing import Any, Optional, Type, cast
+from functools import wraps
+from typing import Any, Callable, Optional, Type, cast
 from urllib.parse import urlencode
 
 try:
-    from chalice import Blueprint, NotFoundError, Response
+    from chalice import (
+        Blueprint,
+        NotFoundError,
+        Response,
+        TooManyRequestsError,
+    )
 except ImportError:
     raise ImportError(
         "You must install agave with [chalice] option.\n"
@@ -14,7 +21,24 @@ from cuenca_validations.types import QueryParams
 from mongoengine import DoesNotExist, Q
 from pydantic import BaseModel, ValidationError
 
+from ..core.batch import parse_ids
 from ..core.blueprints.decorators import copy_attributes
+from ..core.counts import CountCache, can_estimate_count, clear_cache_after
+from ..core.encoders import dumps
+from ..core.etags import etag_matches, make_etag
+from ..core.exc import TooManyRequests, UnprocessableEntity
+from ..core.indexes import (
+    explain_query,
+    index_report,
+    log_index_report,
+    should_explain,
+)
+from ..core.rate_limit import RateLimiter
+from ..core.raw_documents import raw_converter
+
+QUERY_ORDER = ('-created_at',)
+
+logger = logging.getLogger(__name__)
 
 
 class RestApiBlueprint(Blueprint):
@@ -60,11 +84,32 @@ class RestApiBlueprint(Blueprint):
             'this method should be override'
         )  # pragma: no cover
 
-    def retrieve_object(self, resource_class: Any, resource_id: str) -> Any:
-        resource_id = (
-            self.current_user_id if resource_id == 'me' else resource_id
+    def rate_limit_key(self) -> Optional[str]:
+        """Bucket of the current request: its api key, or its platform"""
+        context = self.current_request.context
+        return context.get('api_key_id') or context.get('platform_id')
+
+    def check_rate_limit(
+        self, resource_class: Any, route: str, query: Any = None
+    ) -> None:
+        limiter: Optional[RateLimiter] = getattr(
+            resource_class, 'rate_limit', None
         )
-        query = Q(id=resource_id)
+        if limiter is None:
+            return
+        key = self.rate_limit_key()
+        if key is None:
+            return
+        try:
+            limiter.check(key, limiter.cost(route, query))
+        except TooManyRequests as exc:
+            raise TooManyRequestsError(exc.error)
+
+    def resource_id(self, resource_id: str) -> str:
+        return self.current_user_id if resource_id == 'me' else resource_id
+
+    def scope_query(self, resource_class: Any, query: Q) -> Q:
+        """Restricts `query` to the objects the current user can access"""
         if self.platform_id_filter_required() and hasattr(
             resource_class.model, 'platform_id'
         ):
@@ -74,13 +119,48 @@ class RestApiBlueprint(Blueprint):
             resource_class.model, 'user_id'
         ):
             query = query & Q(user_id=self.current_user_id)
-
+        return query
+
+    def retrieve_object(
+        self,
+        resource_class: Any,
+        resource_id: str,
+        only: Optional[list[str]] = None,
+        as_pymongo: bool = False,
+    ) -> Any:
+        query = self.scope_query(
+            resource_class, Q(id=self.resource_id(resource_id))
+        )
+        query_set = resource_class.model.objects
+        if only:
+            query_set = query_set.only(*only)
+        if as_pymongo:
+            query_set = query_set.as_pymongo()
         try:
-            data = resource_class.model.objects.get(query)
+            data = query_set.get(query)
         except DoesNotExist:
             raise NotFoundError('Not valid id')
         return data
 
+    def retrieve_objects(
+        self,
+        resource_class: Any,
+        resource_ids: list[str],
+        as_pymongo: bool = False,
+    ) -> list:
+        """
+        Same as `retrieve_object` for several ids with a single `$in`
+        query, the ids that are not found are simply not returned.
+        """
+        query = self.scope_query(
+            resource_class,
+            Q(id__in=[self.resource_id(i) for i in resource_ids]),
+        )
+        query_set = resource_class.model.objects.filter(query)
+        if as_pymongo:
+            query_set = query_set.as_pymongo()
+        return list(query_set)
+
     def validate(self, validation_type: Type[BaseModel]):
         """This decorator validate the request body using a
         custom pydantyc model. If validation fails return a
@@ -110,6 +190,11 @@ class RestApiBlueprint(Blueprint):
         class Items(Resource):
             model = MyMongoModel
             query_validator = MyPydanticModel
+            count_cache_ttl = 60  # Optional, seconds to cache counts
+            raw_documents = True  # Optional, skip building Documents
+            etag_field = 'updated_at'  # Optional, version for the ETag
+            explain_sample_rate = 0.01  # Optional, log explain() of queries
+            rate_limit = RateLimiter(10, 50)  # Optional, see below
 
             def create(): ...
             def delete(id): ...
@@ -121,8 +206,31 @@ class RestApiBlueprint(Blueprint):
         POST /my_resource
         PATCH /my_resource
         DELETE /my_resource/id
+        GET /my_resource/batch?ids=id1,id2  # without custom retrieve
         GET /my_resource/id
         GET /my_resource
+
+        With `raw_documents` the default retrieve and query endpoints read
+        raw documents and convert them with the same rules as `to_dict`,
+        which is much cheaper than building every `Document`. Only enable
+        it when the model does not override `to_dict`.
+
+        The default retrieve sends a strong `ETag` and answers `304 Not
+        Modified` to a matching `If-None-Match`. The ETag is a hash of the
+        content unless `etag_field` names a field that changes on every
+        update (a version or `updated_at`), then it is checked by reading
+        only that field.
+
+        When the resource is registered its query access patterns (tenant
+        filters, `query_validator` fields and sort) are compared with the
+        indexes of the model and every missing index is logged as a
+        warning, see `cls.index_report`. With `explain_sample_rate` that
+        fraction of the queries is explained and logged.
+
+        With `rate_limit` every call takes tokens from the bucket of the
+        api key (or platform) of the request, see `RateLimiter`. Calls
+        without tokens left get a `TooManyRequestsError`, the limiter backend
+        must be synchronous.
         """
 
         def wrapper_resource_class(cls):
@@ -130,6 +238,43 @@ class RestApiBlueprint(Blueprint):
             :param cls: Resoucre class
             :return:
             """
+            count_cache: Optional[CountCache] = None
+            if getattr(cls, 'count_cache_ttl', None):
+                count_cache = cls.count_cache = CountCache(cls.count_cache_ttl)
+
+            def invalidate_counts() -> None:
+                if count_cache:
+                    count_cache.clear()
+
+            raw_documents = getattr(cls, 'raw_documents', False)
+            convert_raw = raw_converter(cls.model) if raw_documents else None
+
+            def to_dict(item: Any) -> dict:
+                return convert_raw(item) if convert_raw else item.to_dict()
+
+            def object_id(item: Any, raw: bool = False) -> str:
+                return str(item['_id'] if raw or convert_raw else item.pk)
+
+            etag_field = getattr(cls, 'etag_field', None)
+
+            def version_of(item: Any) -> Any:
+                if not isinstance(item, dict):
+                    return getattr(item, etag_field)
+                field = cls.model._fields[etag_field]
+                value = item.get(field.db_field)
+                return value if value is None else field.to_python(value)
+
+            custom_retrieve = hasattr(cls, 'retrieve') or hasattr(
+                cls, 'download'
+            )
+
+            def rate_limited(func: Callable, route_name: str) -> Callable:
+                @wraps(func)
+                def wrapper(*args, **kwargs):
+                    self.check_rate_limit(cls, route_name)
+                    return func(*args, **kwargs)
+
+                return wrapper
 
             """ POST /resource
             Create a chalice endpoint using the method "create"
@@ -137,7 +282,14 @@ class RestApiBlueprint(Blueprint):
             """
             if hasattr(cls, 'create'):
                 route = self.post(path)
-                route(cls.create)
+                create = (
+                    clear_cache_after(cls.create, count_cache)
+                    if count_cache
+                    else cls.create
+                )
+                if getattr(cls, 'rate_limit', None):
+                    create = rate_limited(create, 'create')
+                route(create)
 
             """ DELETE /resource/{id}
             Use "delete" method (if exists) to create the chalice endpoint
@@ -149,8 +301,12 @@ class RestApiBlueprint(Blueprint):
 
                 @copy_attributes(cls)
                 def delete(id: str):
+                    self.check_rate_limit(cls, 'delete')
                     model = self.retrieve_object(cls, id)
-                    return cls.delete(model)
+                    try:
+                        return cls.delete(model)
+                    finally:
+                        invalidate_counts()
 
                 route(delete)
 
@@ -164,6 +320,7 @@ class RestApiBlueprint(Blueprint):
 
                 @copy_attributes(cls)
                 def update(id: str):
+                    self.check_rate_limit(cls, 'update')
                     params = self.current_request.json_body or dict()
                     try:
                         data = cls.update_validator(**params)
@@ -171,10 +328,41 @@ class RestApiBlueprint(Blueprint):
                         return Response(e.json(), status_code=400)
 
                     model = self.retrieve_object(cls, id)
-                    return cls.update(model, data)
+                    try:
+                        return cls.update(model, data)
+                    finally:
+                        invalidate_counts()
 
                 route(update)
 
+            """ GET /resource/batch?ids=id1,id2
+            Retrieve several objects with a single query. It is only
+            created when "retrieve" and "download" are not customized.
+            """
+            if not custom_retrieve:
+
+                @self.get(path + '/batch')
+                @copy_attributes(cls)
+                def batch_retrieve():
+                    self.check_rate_limit(cls, 'batch_retrieve')
+                    params = self.current_request.query_params or dict()
+                    try:
+                        resource_ids = parse_ids(params.get('ids'))
+                    except UnprocessableEntity as exc:
+                        return Response(dict(error=exc.error), status_code=400)
+                    objs = self.retrieve_objects(
+                        cls, resource_ids, raw_documents
+                    )
+                    found = {object_id(obj): obj for obj in objs}
+                    items, missing_ids = [], []
+                    for resource_id in resource_ids:
+                        obj = found.get(self.resource_id(resource_id))
+                        if obj is None:
+                            missing_ids.append(resource_id)
+                        else:
+                            items.append(to_dict(obj))
+                    return dict(items=items, missing_ids=missing_ids)
+
             @self.get(path + '/{id}')
             @copy_attributes(cls)
             def retrieve(id: str):
@@ -189,6 +377,12 @@ class RestApiBlueprint(Blueprint):
                 The most of times this implementation is enough and is not
                 necessary define a custom "retrieve" method
                 """
+                self.check_rate_limit(cls, 'retrieve')
+                if not custom_retrieve:
+                    return _retrieve_item(
+                        id, self.current_request.headers.get('if-none-match')
+                    )
+
                 obj = self.retrieve_object(cls, id)
 
                 # This case is when the return is not an application/$
@@ -210,13 +404,44 @@ class RestApiBlueprint(Blueprint):
                         },
                         status_code=200,
                     )
-                elif hasattr(cls, 'retrieve'):
-                    result = cls.retrieve(obj)
                 else:
-                    result = obj.to_dict()
+                    result = cls.retrieve(obj)
 
                 return result
 
+            def _retrieve_item(id: str, if_none_match: Optional[str]):
+                """
+                Default retrieve with a strong `ETag`. With `etag_field` the
+                ETag derives from the document version, so when the client
+                sends `If-None-Match` only that field is read to answer
+                `304`. Otherwise it is a hash of the content.
+                """
+                if etag_field and if_none_match:
+                    version = self.retrieve_object(
+                        cls, id, [etag_field], as_pymongo=True
+                    )
+                    etag = make_etag(
+                        object_id(version, raw=True), version_of(version), None
+                    )
+                    if etag_matches(if_none_match, etag):
+                        return not_modified(etag)
+
+                obj = self.retrieve_object(cls, id, as_pymongo=raw_documents)
+                item = to_dict(obj)
+                if etag_field:
+                    etag = make_etag(object_id(obj), version_of(obj), None)
+                else:
+                    etag = make_etag(item, None)
+                    if etag_matches(if_none_match, etag):
+                        return not_modified(etag)
+                return Response(item, headers={'ETag': etag})
+
+            if hasattr(cls, 'query_validator'):
+                cls.index_report = index_report(
+                    cls.model, cls.query_validator.model_fields, QUERY_ORDER
+                )
+                log_index_report(cls.__name__, cls.index_report)
+
             @self.get(path)
             @copy_attributes(cls)
             def query():
@@ -229,7 +454,8 @@ class RestApiBlueprint(Blueprint):
 
                 If param "count" is True return the next response
                 {
-                    count:<count>
+                    count:<count>,
+                    approximate:<true when estimated or read from cache>
                 }
 
                 else the response is like this
@@ -243,6 +469,7 @@ class RestApiBlueprint(Blueprint):
                     query_params = cls.query_validator(**params)
                 except ValidationError as e:
                     return Response(e.json(), status_code=400)
+                self.check_rate_limit(cls, 'query', query_params)
 
                 if self.platform_id_filter_required() and hasattr(
                     cls.model, 'platform_id'
@@ -271,8 +498,19 @@ class RestApiBlueprint(Blueprint):
                 return result
 
             def _count(filters: Q):
+                if can_estimate_count(cls.model, filters):
+                    collection = cls.model._get_collection()
+                    count = collection.estimated_document_count()
+                    return dict(count=count, approximate=True)
+                if count_cache:
+                    key = count_cache.key(cls.model, filters)
+                    cached = count_cache.get(key)
+                    if cached is not None:
+                        return dict(count=cached, approximate=True)
                 count = cls.model.objects.filter(filters).count()
-                return dict(count=count)
+                if count_cache:
+                    count_cache.set(key, count)
+                return dict(count=count, approximate=False)
 
             def _all(query: QueryParams, filters: Q):
                 if query.limit:
@@ -280,17 +518,32 @@ class RestApiBlueprint(Blueprint):
                     query.limit = max(0, query.limit - limit)  # type: ignore
                 else:
                     limit = query.page_size
-                items = (
-                    cls.model.objects.order_by("-created_at")
+                wants_more = query.limit is None or query.limit > 0
+                # fetch one extra item to know if there is a next page
+                # within the same cursor instead of a second `count` query
+                query_set = (
+                    cls.model.objects.order_by(*QUERY_ORDER)
                     .filter(filters)
-                    .limit(limit)
+                    .limit(limit + 1 if wants_more else limit)
                 )
-                item_dicts = [i.to_dict() for i in items]
-
-                has_more: Optional[bool] = None
-                if wants_more := query.limit is None or query.limit > 0:
-                    # only perform this query if it's necessary
-                    has_more = items.limit(limit + 1).count() > limit
+                if raw_documents:
+                    query_set = query_set.as_pymongo()
+                items = list(query_set)
+                if should_explain(getattr(cls, 'explain_sample_rate', 0)):
+                    request = self.current_request
+                    logger.info(
+                        dumps(
+                            dict(
+                                request=dict(
+                                    method=request.method, path=request.path
+                                ),
+                                explain=explain_query(query_set),
+                            ),
+                            default=str,
+                        )
+                    )
+                has_more = len(items) > limit
+                item_dicts = [to_dict(i) for i in items[:limit]]
 
                 next_page_uri: Optional[str] = None
                 if wants_more and has_more:
@@ -307,3 +560,7 @@ class RestApiBlueprint(Blueprint):
             return cls
 
         return wrapper_resource_class
+
+
+def not_modified(etag: str) -> Response:
+    return Response('', headers={'ETag': etag}, status_code=304)
@@ -0,0 +1,24 @@
+from typing import Optional
+
+from cuenca_validations.types.queries import MAX_PAGE_SIZE
+
+from .exc import UnprocessableEntity
+
+BATCH_MAX_IDS = MAX_PAGE_SIZE
+
+
+def parse_ids(ids: Optional[str]) -> list[str]:
+    """
+    Parses the comma separated `ids` param of batch retrieve endpoints,
+    keeping the order in which they were sent without duplicates.
+    """
+    resource_ids = list(
+        dict.fromkeys(i.strip() for i in (ids or '').split(',') if i.strip())
+    )
+    if not resource_ids:
+        raise UnprocessableEntity('ids param is required')
+    if len(resource_ids) > BATCH_MAX_IDS:
+        raise UnprocessableEntity(
+            f'Too many ids, the maximum is {BATCH_MAX_IDS}'
+        )
+    return resource_ids
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from mongoengine import Q
+
+
+class CountCache:
+    """
+    TTL cache for the results of `count=true` queries of a resource.
+
+    Entries are keyed by the normalized Mongo filter. The tenant filters
+    (`user_id`, `platform_id` and the custom ones) are part of it, so counts
+    are never shared between tenants. The resource clears the cache every
+    time its create, update or delete handlers run, the TTL bounds how stale
+    a count can be when the collection is modified somewhere else.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, int]] = OrderedDict()
+
+    @staticmethod
+    def key(model: Any, filters: Q) -> str:
+        return json.dumps(filters.to_query(model), sort_keys=True, default=str)
+
+    def get(self, key: str) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, count = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return count
+
+    def set(self, key: str, count: int) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, count)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def can_estimate_count(model: Any, filters: Q) -> bool:
+    """
+    `estimated_document_count` reads the collection metadata instead of
+    scanning an index, it is only valid when nothing is filtered, including
+    the `_cls` filter added to models with inheritance.
+    """
+    return filters.empty and not model._meta.get('allow_inheritance')
+
+
+def clear_cache_after(func: Callable, cache: CountCache) -> Callable:
+    if asyncio.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                cache.clear()
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            cache.clear()
+
+    return wrapper
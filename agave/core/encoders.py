@@ -0,0 +1,60 @@
+import json
+import os
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+JSON = 'json'
+ORJSON = 'orjson'
+
+# datetimes and dataclasses go through `default` like they do with json,
+# so `default=str` logs them the same way
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    if orjson
+    else 0
+)
+
+json_encoder = os.getenv('AGAVE_JSON_ENCODER', ORJSON if orjson else JSON)
+
+
+def set_json_encoder(name: str) -> None:
+    """
+    Selects the serializer of logs, task messages and JSON responses:
+    `orjson` (the default when it is installed) or the stdlib `json`.
+    """
+    global json_encoder
+    if name not in (JSON, ORJSON):
+        raise ValueError(f'Invalid JSON encoder: {name}')
+    if name == ORJSON and not orjson:
+        raise ImportError(
+            "You must install agave with [orjson] option.\n"
+            "You can install it with: pip install agave[orjson]"
+        )
+    json_encoder = name
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    if json_encoder == ORJSON:
+        return orjson.dumps(
+            obj, default=default, option=ORJSON_OPTIONS
+        ).decode()
+    return json.dumps(obj, default=default)
+
+
+def render(content: Any) -> bytes:
+    """Body of a JSON response, as compact as starlette renders it"""
+    if json_encoder == ORJSON:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(',', ':'),
+    ).encode('utf-8')
@@ -0,0 +1,23 @@
+import json
+from hashlib import blake2b
+from typing import Any, Optional
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the values that identify a representation"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return f'"{blake2b(payload.encode(), digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    `If-None-Match` uses the weak comparison, so `W/` prefixes are ignored
+    and `*` matches any current representation.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
@@ -46,6 +46,7 @@ class UnprocessableEntity(AgaveError):
 @dataclass
 class TooManyRequests(AgaveError):
     status_code: int = 429
+    retry_after: Optional[int] = None
 
 
 @dataclass
@@ -56,6 +57,7 @@ class AgaveViewError(AgaveError):
 @dataclass
 class ServiceUnavailableError(AgaveError):
     status_code: int = 503
+    retry_after: Optional[int] = None
 
 
 @dataclass
@@ -0,0 +1,153 @@
+import logging
+import random
+from itertools import combinations
+from typing import Any, Iterable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+TENANT_FIELDS = ('platform_id', 'user_id')
+# query params that are not equality filters on a model field
+NON_FILTER_PARAMS = {
+    'active',
+    'count',
+    'created_after',
+    'created_before',
+    'key',
+    'limit',
+    'page_size',
+}
+
+IndexKeys = list[tuple[str, Any]]
+
+
+def db_field(model: Any, name: str) -> str:
+    name = name.lstrip('-')
+    if name in ('id', 'pk'):
+        return '_id'
+    field = model._fields.get(name)
+    return field.db_field if field else name
+
+
+def declared_indexes(model: Any) -> list[IndexKeys]:
+    return [[('_id', 1)]] + [
+        list(spec['fields']) for spec in model._meta.get('index_specs', [])
+    ]
+
+
+def _serves_sort(
+    index: IndexKeys, equality: set[str], sort: list[tuple[str, int]]
+) -> bool:
+    """
+    An index serves a sort when the equality fields are its prefix (in any
+    order) and the sort keys follow in the same or the reversed direction.
+    """
+    prefix = index[: len(equality)]
+    if {name for name, _ in prefix} != equality:
+        return False
+    keys = index[len(equality) : len(equality) + len(sort)]  # noqa: E203
+    if [name for name, _ in keys] != [name for name, _ in sort]:
+        return False
+    directions = [d1 == d2 for (_, d1), (_, d2) in zip(keys, sort)]
+    return all(directions) or not any(directions)
+
+
+def _serves_filter(index: IndexKeys, name: str, tenant: set[str]) -> bool:
+    for key, _ in index:
+        if key == name:
+            return True
+        if key not in tenant:
+            return False
+    return False
+
+
+def index_report(
+    model: Any, filter_fields: Iterable[str], sort: Sequence[str]
+) -> list[str]:
+    """
+    Compares the access patterns of a resource with the indexes declared
+    in `model.meta`. The tenant filters (`platform_id`/`user_id`) are added
+    depending on the request so every combination of them is checked
+    together with the fixed sort of the query endpoint.
+    """
+    indexes = declared_indexes(model)
+    tenant = [db_field(model, f) for f in TENANT_FIELDS if f in model._fields]
+    sort_keys = [
+        (db_field(model, name), -1 if name.startswith('-') else 1)
+        for name in sort
+    ]
+    problems = []
+    for size in range(len(tenant) + 1):
+        for equality in combinations(tenant, size):
+            if any(_serves_sort(i, set(equality), sort_keys) for i in indexes):
+                continue
+            target = (
+                f'filtered by {", ".join(equality)}'
+                if equality
+                else 'without tenant filters'
+            )
+            problems.append(
+                f'in-memory sort: no index on '
+                f'({", ".join([*equality, *sort])}) for queries {target}'
+            )
+    for name in filter_fields:
+        if (
+            name in NON_FILTER_PARAMS
+            or name in TENANT_FIELDS
+            or name not in model._fields
+        ):
+            continue
+        key = db_field(model, name)
+        if not any(_serves_filter(i, key, set(tenant)) for i in indexes):
+            problems.append(
+                f'collection scan: no index starts with `{name}` '
+                f'(optionally after the tenant fields)'
+            )
+    return problems
+
+
+def log_index_report(resource: str, problems: list[str]) -> None:
+    for problem in problems:
+        logger.warning('Index advisor %s: %s', resource, problem)
+
+
+def should_explain(sample_rate: Optional[float]) -> bool:
+    return bool(sample_rate) and random.random() < sample_rate  # type: ignore
+
+
+def _plan_stages(plan: dict) -> list[dict]:
+    stages = [plan]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def summarize_explain(explain: dict) -> dict:
+    """Keeps the parts of `explain()` that tell how a query was resolved"""
+    stages = _plan_stages(
+        explain.get('queryPlanner', {}).get('winningPlan', {})
+    )
+    names = [stage['stage'] for stage in stages if 'stage' in stage]
+    stats = explain.get('executionStats', {})
+    return dict(
+        stages=names,
+        indexes=[
+            stage['indexName'] for stage in stages if 'indexName' in stage
+        ],
+        collection_scan='COLLSCAN' in names,
+        in_memory_sort='SORT' in names,
+        returned=stats.get('nReturned'),
+        keys_examined=stats.get('totalKeysExamined'),
+        docs_examined=stats.get('totalDocsExamined'),
+        time_ms=stats.get('executionTimeMillis'),
+    )
+
+
+def explain_query(query_set: Any) -> Optional[dict]:
+    try:
+        return summarize_explain(query_set.explain())
+    except Exception:
+        logger.exception('Unable to explain query')
+        return None
@@ -0,0 +1,134 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Optional
+
+from .encoders import dumps
+
+logger = logging.getLogger(__name__)
+
+DROP_NEW = 'drop_new'
+DROP_OLD = 'drop_old'
+LOG_SINK_MAX_SIZE = int(os.getenv('AGAVE_LOG_SINK_MAX_SIZE', '10000'))
+
+Record = tuple[logging.Logger, dict[str, Any]]
+
+
+class QueueLogSink:
+    """
+    Moves the JSON encoding and the handler I/O of the request and task
+    logs out of the event loop.
+
+    `emit` only puts the record in a bounded queue, a daemon thread encodes
+    and writes it with the given logger. When the queue is full the record
+    is dropped (`drop_new`) or replaces the oldest one (`drop_old`), either
+    way it is counted in `dropped`. Pending records are flushed at exit.
+    """
+
+    def __init__(
+        self, max_size: int = LOG_SINK_MAX_SIZE, overflow: str = DROP_NEW
+    ):
+        if overflow not in (DROP_NEW, DROP_OLD):
+            raise ValueError(f'Invalid overflow policy: {overflow}')
+        self.overflow = overflow
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue: queue.Queue[Record] = queue.Queue(max_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return dict(
+            enqueued=self.enqueued,
+            written=self.written,
+            dropped=self.dropped,
+            errors=self.errors,
+            pending=self._queue.qsize(),
+        )
+
+    def emit(self, log: logging.Logger, data: dict[str, Any]) -> None:
+        if not log.isEnabledFor(logging.INFO):
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((log, data))
+        except queue.Full:
+            if self.overflow == DROP_NEW:
+                self.dropped += 1
+                return
+            self._drop_oldest()
+            try:
+                self._queue.put_nowait((log, data))
+            except queue.Full:
+                self.dropped += 1
+                return
+        self.enqueued += 1
+
+    def write(self, log: logging.Logger, data: dict[str, Any]) -> None:
+        try:
+            log.info(dumps(data, default=str))
+        except Exception:
+            self.errors += 1
+        else:
+            self.written += 1
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every enqueued record is written"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = (
+                    None if deadline is None else deadline - time.monotonic()
+                )
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _drop_oldest(self) -> None:
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            return
+        self._queue.task_done()
+        self.dropped += 1
+
+    def _ensure_worker(self) -> None:
+        # the thread does not survive a fork, the child starts its own
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='agave-log-sink', daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            log, data = self._queue.get()
+            try:
+                self.write(log, data)
+            finally:
+                self._queue.task_done()
+
+
+log_sink = QueueLogSink()
+
+
+@atexit.register
+def _flush_log_sink() -> None:
+    if not log_sink.flush(timeout=5):
+        logger.warning(
+            'Log sink closed with %d pending records',
+            log_sink.stats['pending'],
+        )
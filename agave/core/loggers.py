@@ -1,6 +1,9 @@
+import os
+import random
 from typing import (
     Any,
     Callable,
+    Iterable,
     Optional,
     Type,
     Union,
@@ -13,6 +16,8 @@ from cuenca_validations.types.general import LogConfig
 from cuenca_validations.types.helpers import get_log_config
 from pydantic import BaseModel
 
+from .encoders import dumps
+
 HEADERS_LOG_CONFIG = {
     'authorization': LogConfig(masked=True),
     'x-cuenca-token': LogConfig(masked=True, unmasked_chars_length=4),
@@ -23,25 +28,167 @@ HEADERS_LOG_CONFIG = {
     'content-length': LogConfig(excluded=True),
 }
 
+DEFAULT_LOG_HEADERS = (
+    'content-type',
+    'user-agent',
+    'x-amzn-trace-id',
+    'x-forwarded-for',
+    'x-request-id',
+)
+
+
+TRUNCATED_MARKER = '...[truncated]'
+SAMPLED_OUT = 'sampled out'
+
+
+def route_log_setting(value: Any, route_name: str, default: Any) -> Any:
+    """
+    Resolves a resource log setting that is either a single value for
+    every route or a dict by route name (`create`, `query`, ...).
+    """
+    if isinstance(value, dict):
+        return value.get(route_name, default)
+    return default if value is None else value
+
+
+def sample_bodies(sample_rate: float) -> bool:
+    return sample_rate >= 1 or random.random() < sample_rate
+
+
+def truncate_body(
+    body: Any, max_size: Optional[int], size: Optional[int] = None
+) -> tuple[Any, Optional[str]]:
+    """
+    Caps a logged body to `max_size` characters of its JSON. `size` is the
+    length of the raw body when it is known, bodies under the cap are
+    returned as they are without encoding them.
+
+    Returns the body to log and a note about what was cut, if anything.
+    """
+    if body is None or max_size is None:
+        return body, None
+    if size is not None and size <= max_size:
+        return body, None
+    encoded = dumps(body, default=str)
+    if len(encoded) <= max_size:
+        return body, None
+    return (
+        encoded[:max_size] + TRUNCATED_MARKER,
+        f'truncated {len(encoded) - max_size} of {len(encoded)} chars',
+    )
+
+
+def _mask(value: Any, log_config: LogConfig) -> Any:
+    if isinstance(value, list):
+        return [_mask(item, log_config) for item in value]
+    log_chars = log_config.unmasked_chars_length
+    return '*****' + value[-log_chars:] if log_chars > 0 else '*****'
+
+
+def _obfuscate_nested(value: Any, plan: dict[str, Any]) -> Any:
+    if isinstance(value, dict):
+        return obfuscate_sensitive_data(value, plan)
+    if isinstance(value, (list, tuple)):
+        items = [_obfuscate_nested(item, plan) for item in value]
+        if any(new is not old for new, old in zip(items, value)):
+            return items
+    return value
+
+
+class HeadersLogConfig:
+    """
+    Precomputed header handling of the request logs. With `allow` only
+    those headers are logged, otherwise every header but the excluded ones
+    in `HEADERS_LOG_CONFIG`. The masked ones are masked either way. Names
+    are compared in lowercase, the way starlette exposes them.
+    """
+
+    def __init__(
+        self,
+        allow: Optional[Iterable[str]] = None,
+        config: dict[str, LogConfig] = HEADERS_LOG_CONFIG,
+    ):
+        self.masked = {
+            name.lower(): log_config
+            for name, log_config in config.items()
+            if log_config.masked and not log_config.excluded
+        }
+        self.excluded = frozenset(
+            name.lower()
+            for name, log_config in config.items()
+            if log_config.excluded
+        )
+        self.configure(allow)
+
+    def configure(self, allow: Optional[Iterable[str]]) -> None:
+        self.allow = (
+            None
+            if allow is None
+            else frozenset(name.lower() for name in allow) - self.excluded
+        )
+
+    def __call__(self, headers: Iterable[tuple[str, str]]) -> dict[str, str]:
+        allow, masked = self.allow, self.masked
+        logged = {}
+        for name, value in headers:
+            if allow is None:
+                if name in self.excluded:
+                    continue
+            elif name not in allow:
+                continue
+            log_config = masked.get(name)
+            logged[name] = _mask(value, log_config) if log_config else value
+        return logged
+
+
+def _allow_from_env() -> Optional[list[str]]:
+    names = os.getenv('AGAVE_LOG_HEADERS')
+    if names is None:
+        return None
+    return [name.strip() for name in names.split(',') if name.strip()]
+
+
+log_headers = HeadersLogConfig(_allow_from_env())
+
+
+def set_log_headers(
+    allow: Optional[Iterable[str]] = DEFAULT_LOG_HEADERS,
+) -> None:
+    """
+    Logs only the `allow` headers (`DEFAULT_LOG_HEADERS` when called
+    without arguments), `None` goes back to logging every header.
+    """
+    log_headers.configure(allow)
+
 
 def obfuscate_sensitive_data(
     body: dict[str, Any],
-    sensitive_fields: dict[str, LogConfig],
+    sensitive_fields: dict[str, Any],
 ) -> dict[str, Any]:
-
-    ofuscated_body = body.copy()
+    """
+    Applies a plan from `get_sensitive_fields`: a `LogConfig` masks or
+    excludes the key, a nested plan is applied to the dict (or every dict
+    of the list) under the key. Only the dicts that change are copied.
+    """
+    ofuscated_body = body
     for field_name, log_config in sensitive_fields.items():
-        if field_name not in ofuscated_body:
+        if field_name not in body:
             continue
 
-        if log_config.excluded:
+        value = body[field_name]
+        if isinstance(log_config, dict):
+            value = _obfuscate_nested(value, log_config)
+            if value is body[field_name]:
+                continue
+        elif not log_config.excluded:
+            value = _mask(value, log_config)
+
+        if ofuscated_body is body:
+            ofuscated_body = body.copy()
+        if isinstance(log_config, LogConfig) and log_config.excluded:
             del ofuscated_body[field_name]
         else:
-            value = ofuscated_body[field_name]
-            log_chars = log_config.unmasked_chars_length
-            ofuscated_body[field_name] = (
-                '*****' + value[-log_chars:] if log_chars > 0 else '*****'
-            )
+            ofuscated_body[field_name] = value
 
     return ofuscated_body
 
@@ -98,27 +245,85 @@ def get_response_model(
         return None
 
 
+def _annotation_models(annotation: Any) -> list[type[BaseModel]]:
+    """Models inside an annotation: Optional, Union, list, Annotated..."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return [annotation]
+    return [
+        model
+        for arg in get_args(annotation)
+        for model in _annotation_models(arg)
+    ]
+
+
+def _merge_plans(
+    plans: list[dict[str, Any]],
+    merged_plans: Optional[dict[tuple[int, ...], dict[str, Any]]] = None,
+) -> dict[str, Any]:
+    if len(plans) == 1:
+        return plans[0]
+    # merged plans are registered first, as in `_model_plan`, so merging
+    # self-referencing plans ends
+    merged_plans = {} if merged_plans is None else merged_plans
+    key = tuple(id(plan) for plan in plans)
+    if key in merged_plans:
+        return merged_plans[key]
+    merged: dict[str, Any] = {}
+    merged_plans[key] = merged
+    for plan in plans:
+        for name, config in plan.items():
+            current = merged.get(name)
+            if isinstance(current, dict) and isinstance(config, dict):
+                if current is not config:
+                    merged[name] = _merge_plans(
+                        [current, config], merged_plans
+                    )
+            elif name not in merged or not isinstance(config, dict):
+                merged[name] = config
+    return merged
+
+
+_PLANS: dict[type[BaseModel], dict[str, Any]] = {}
+
+
+def _model_plan(model: type[BaseModel]) -> dict[str, Any]:
+    """
+    Obfuscation plan of a model, built once. The plan of a model is
+    registered before its fields are walked so self-referencing models get
+    a plan that references itself.
+    """
+    if model in _PLANS:
+        return _PLANS[model]
+    plan: dict[str, Any] = {}
+    _PLANS[model] = plan
+    for field_name, field in model.model_fields.items():
+        log_config = get_log_config(field)
+        if log_config and (log_config.masked or log_config.excluded):
+            plan[field_name] = log_config
+            continue
+        nested = [
+            _model_plan(nested_model)
+            for nested_model in _annotation_models(field.annotation)
+        ]
+        nested = [nested_plan for nested_plan in nested if nested_plan]
+        if nested:
+            plan[field_name] = _merge_plans(nested)
+    return plan
+
+
 def get_sensitive_fields(
     models: Optional[Union[list[type[BaseModel]], type[BaseModel]]],
 ) -> dict[str, Any]:
     """
-    Analyzes a list of Pydantic models and returns
-    a set of field names marked as sensitive in their metadata.
+    Analyzes a list of Pydantic models and returns the plan used by
+    `obfuscate_sensitive_data`: the fields marked as sensitive in their
+    metadata and, for fields holding other models (directly, in lists or
+    in unions), the plan of those models.
     """
-    sensitive_fields: dict[str, Any] = {}
-
     if models is None or models is Any:
-        return sensitive_fields
+        return {}
 
     if not isinstance(models, list):
         models = [models]
 
-    for m in models:
-        for field_name, field in m.model_fields.items():
-            log_config = get_log_config(field)
-            if not log_config:
-                continue
-            if log_config.masked or log_config.excluded:
-                sensitive_fields[field_name] = log_config
-
-    return sensitive_fields
+    return _merge_plans([{}, *(_model_plan(m) for m in models)])
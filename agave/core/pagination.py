@@ -0,0 +1,55 @@
+import datetime as dt
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from typing import NamedTuple, Optional
+
+from mongoengine import Q
+
+from .exc import UnprocessableEntity
+
+CURSOR_ORDER = ('-created_at', '-pk')
+
+
+class Cursor(NamedTuple):
+    created_at: dt.datetime
+    pk: str
+    limit: Optional[int] = None
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """
+    Builds an opaque cursor from the sort key of the last item in a page
+    and the number of items left when the query has a `limit`.
+    """
+    payload = json.dumps(
+        [cursor.created_at.isoformat(), str(cursor.pk), cursor.limit]
+    )
+    return urlsafe_b64encode(payload.encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        created_at, pk, limit = json.loads(urlsafe_b64decode(cursor.encode()))
+        return Cursor(
+            dt.datetime.fromisoformat(created_at),
+            str(pk),
+            None if limit is None else int(limit),
+        )
+    except (BinasciiError, TypeError, ValueError):
+        raise UnprocessableEntity('Invalid cursor')
+
+
+def cursor_query(cursor: Cursor) -> Q:
+    """
+    Seek predicate for pages sorted by `CURSOR_ORDER`.
+
+    The outer `created_at <= value` bound keeps the scan inside a single
+    range of a `(created_at, _id)` compound index and the `$or` only breaks
+    ties between items created at the same instant. The model must declare
+    that index (prefixed by any equality filter such as `user_id`),
+    otherwise Mongo sorts the matching documents in memory.
+    """
+    return Q(created_at__lte=cursor.created_at) & (
+        Q(created_at__lt=cursor.created_at) | Q(pk__lt=cursor.pk)
+    )
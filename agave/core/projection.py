@@ -0,0 +1,85 @@
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+from pydantic import BaseModel, create_model
+from pydantic.fields import FieldInfo
+
+from .exc import UnprocessableEntity
+
+
+def parse_fields(
+    fields: Optional[str], allowed: Iterable[str]
+) -> Optional[list[str]]:
+    """
+    Parses the comma separated `fields` param and validates every name
+    against the `allowed` ones.
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    invalid = sorted(set(names) - set(allowed))
+    if invalid:
+        raise UnprocessableEntity(f'Invalid fields: {", ".join(invalid)}')
+    return list(dict.fromkeys(names))
+
+
+def projection_fields(model: Any, fields: list[str]) -> Optional[list[str]]:
+    """
+    Model fields to load from Mongo for the requested `fields`.
+
+    The primary key is always returned by Mongo and `created_at` is always
+    loaded because pagination relies on it. Returns `None` when a requested
+    field can not be mapped to a model field (e.g. a value computed by
+    `to_dict`), in that case the whole document has to be loaded.
+    """
+    projection = {name for name in fields if name != 'id'}
+    if any(name not in model._fields for name in projection):
+        return None
+    if 'created_at' in model._fields:
+        projection.add('created_at')
+    return sorted(projection)
+
+
+def project(item: dict[str, Any], fields: list[str]) -> dict[str, Any]:
+    return {name: item[name] for name in ['id', *fields] if name in item}
+
+
+def output_fields(model: type[BaseModel]) -> dict[str, str]:
+    """
+    Maps the keys emitted when `model` is serialized by alias (like FastAPI
+    does for `response_model`) to its attribute names.
+    """
+    return {
+        field.serialization_alias or field.alias or name: name
+        for name, field in model.model_fields.items()
+    }
+
+
+@lru_cache
+def partial_model(model: type[BaseModel]) -> type[BaseModel]:
+    """
+    Copy of `model` where every field is optional, used to serialize the
+    subset of fields requested with `fields` exactly like `model` would.
+    """
+    fields: dict[str, Any] = {
+        name: (
+            Optional[field.annotation],  # type: ignore[name-defined]
+            FieldInfo.merge_field_infos(field, default=None),
+        )
+        for name, field in model.model_fields.items()
+    }
+    return create_model(  # type: ignore[call-overload]
+        f'Partial{model.__name__}', __config__=model.model_config, **fields
+    )
+
+
+def serialize_projection(
+    model: type[BaseModel], item: dict[str, Any], fields: list[str]
+) -> dict[str, Any]:
+    names = output_fields(model)
+    include = {names[name] for name in ['id', *fields] if name in names}
+    return (
+        partial_model(model)
+        .model_validate(item)
+        .model_dump(mode='json', by_alias=True, include=include)
+    )
@@ -0,0 +1,103 @@
+import inspect
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Optional, Protocol, Union
+
+from .exc import TooManyRequests
+
+
+class RateLimitBackend(Protocol):
+    def take(
+        self, key: str, cost: float, rate: float, burst: float
+    ) -> Union[float, Awaitable[float]]:
+        """
+        Takes `cost` tokens from the bucket of `key`, which is refilled with
+        `rate` tokens per second up to `burst`. Returns 0 when the tokens
+        were taken, otherwise the seconds until there are enough of them.
+        A shared backend (e.g. Redis) can return an awaitable, it can only
+        be used with the FastAPI blueprint then.
+        """
+
+
+class MemoryBackend:
+    """
+    Token buckets of this process. The least recently used buckets are
+    dropped past `max_keys`, they start full again.
+    """
+
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+@dataclass
+class RateLimiter:
+    """
+    Token bucket per api key, or per platform for requests without one.
+
+    `rate` is the number of tokens refilled per second and `burst` the size
+    of the bucket. Every call takes `costs[route]` tokens (1 by default),
+    `count=true` queries take `costs['count']` and queries add
+    `costs['item']` per requested item, so larger pages cost more. The
+    cost is capped to `burst`.
+    """
+
+    rate: float
+    burst: float
+    costs: dict[str, float] = field(default_factory=dict)
+    backend: RateLimitBackend = field(default_factory=MemoryBackend)
+    prefix: str = 'agave'
+
+    def cost(self, route: str, query: Optional[Any] = None) -> float:
+        if query is not None and getattr(query, 'count', False):
+            cost = self.costs.get('count', 1.0)
+        else:
+            cost = self.costs.get(route, 1.0)
+            if query is not None:
+                items = min(query.page_size, query.limit or query.page_size)
+                cost += self.costs.get('item', 0.0) * items
+        return min(cost, self.burst)
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}:{key}'
+
+    def _raise_on_wait(self, wait: float) -> None:
+        if wait > 0:
+            retry_after = math.ceil(wait)
+            raise TooManyRequests(
+                f'Rate limit exceeded, retry in {retry_after} seconds',
+                retry_after=retry_after,
+            )
+
+    def check(self, key: str, cost: float = 1.0) -> None:
+        wait = self.backend.take(self._key(key), cost, self.rate, self.burst)
+        if inspect.isawaitable(wait):
+            if inspect.iscoroutine(wait):
+                wait.close()
+            raise TypeError('Use `async_check` with an async backend')
+        self._raise_on_wait(wait)
+
+    async def async_check(self, key: str, cost: float = 1.0) -> None:
+        wait = self.backend.take(self._key(key), cost, self.rate, self.burst)
+        if inspect.isawaitable(wait):
+            wait = await wait
+        self._raise_on_wait(wait)
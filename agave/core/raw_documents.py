@@ -0,0 +1,106 @@
+from functools import lru_cache, partial
+from typing import Any, Callable
+
+from mongoengine import (
+    DateTimeField,
+    DictField,
+    EmbeddedDocumentField,
+    GenericLazyReferenceField,
+    LazyReferenceField,
+    ListField,
+)
+from mongoengine_plus.models.helpers import (
+    list_field_to_dict,
+    mongo_to_dict,
+    mongo_to_python_type,
+)
+from mongoengine_plus.types import EnumField
+
+HIDDEN_VALUE = '********'
+
+Rule = Callable[[Any], Any]
+
+
+def _lazy_reference_uri(data: Any) -> Any:
+    return f'/{data._DBRef__collection}/{data.id}' if data else None
+
+
+def _generic_lazy_reference_uri(data: Any) -> Any:
+    return (
+        f'/{data["_ref"]._DBRef__collection}/{data["_ref"].id}'
+        if data
+        else None
+    )
+
+
+def _to_dict_rule(name: str, field: Any) -> tuple[str, Rule]:
+    """
+    Output key and serialization of a field, in the same order of
+    precedence as `mongo_to_dict`.
+    """
+    if isinstance(field, ListField):
+        if isinstance(field.field, LazyReferenceField):
+            name = f'{name}_uris'
+        return name, list_field_to_dict
+    if isinstance(field, EmbeddedDocumentField):
+        return name, lambda data: mongo_to_dict(data, [])
+    if isinstance(field, DictField):
+        return name, lambda data: data
+    if isinstance(field, EnumField):
+        return name, lambda data: data.value if data is not None else None
+    if isinstance(field, LazyReferenceField):
+        return f'{name}_uri', _lazy_reference_uri
+    if isinstance(field, GenericLazyReferenceField):
+        return f'{name}_uri', _generic_lazy_reference_uri
+    if type(field) is DateTimeField:
+        return name, lambda data: None if data is None else data.isoformat()
+    return name, partial(mongo_to_python_type, field)
+
+
+def _default(field: Any) -> Callable[[], Any]:
+    if callable(field.default):
+        return field.default
+    return lambda: field.default
+
+
+@lru_cache
+def raw_converter(model: Any) -> Callable[[dict], dict]:
+    """
+    Builds a function that converts a raw document (`as_pymongo()`) of
+    `model` into the same dict `model.to_dict()` returns, without building
+    the mongoengine `Document`.
+
+    The rules of each field are resolved once per model. Missing fields
+    get the field default and present ones go through `field.to_python`,
+    like `Document._from_son` does. Documents of a subclass (with a
+    different `_cls`) fall back to `to_dict`.
+    """
+    excluded = {
+        *model._excluded,
+        *(name for name in dir(model) if name.startswith('_')),
+        'id',
+    }
+    plan = [
+        (*_to_dict_rule(name, field), field.db_field, field, _default(field))
+        for name, field in model._fields.items()
+        if name not in excluded
+    ]
+    hidden = list(model._hidden)
+    class_name = model._class_name
+
+    def to_dict(raw: dict) -> dict:
+        if raw.get('_cls', class_name) != class_name:
+            return model._from_son(raw).to_dict()
+        item = {'id': str(raw['_id'])}
+        for key, rule, db_field, field, default in plan:
+            if db_field in raw:
+                value = raw[db_field]
+                data = value if value is None else field.to_python(value)
+            else:
+                data = default()
+            item[key] = rule(data)
+        for name in hidden:
+            item[name] = HIDDEN_VALUE
+        return item
+
+    return to_dict
@@ -0,0 +1,158 @@
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterator, Optional
+
+# upper bounds in ms, the last bucket takes everything above
+HISTOGRAM_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestTimer:
+    """
+    Accumulated time per phase of a request. The phases are cumulative and
+    can overlap, e.g. `db` is counted inside `handler` and concurrent
+    queries add up.
+    """
+
+    __slots__ = ('start', 'phases')
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def as_dict(self) -> dict[str, float]:
+        """Phases in ms, with the `total` so far"""
+        timings = {
+            phase: round(seconds * 1000, 3)
+            for phase, seconds in self.phases.items()
+        }
+        timings['total'] = round(self.elapsed() * 1000, 3)
+        return timings
+
+
+request_timer: ContextVar[Optional[RequestTimer]] = ContextVar(
+    'request_timer', default=None
+)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Adds the time of the block to the timer of the current request"""
+    timer = request_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(phase, time.perf_counter() - start)
+
+
+def timed_call(func: Callable, phase: str) -> Callable:
+    if asyncio.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with timed(phase):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed(phase):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class TimingHistogram:
+    """
+    Histograms of the phase timings by method and route. `snapshot` dumps
+    them as a dict and `to_prometheus` in the text exposition format so
+    they can be scraped.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self._series: dict[tuple[str, str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, timings: dict) -> None:
+        with self._lock:
+            for phase, ms in timings.items():
+                key = (method, route, phase)
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = [
+                        [0] * (len(self.buckets) + 1),
+                        0.0,
+                    ]
+                series[0][bisect.bisect_left(self.buckets, ms)] += 1
+                series[1] += ms
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                dict(
+                    method=method,
+                    route=route,
+                    phase=phase,
+                    buckets=dict(
+                        zip([*map(str, self.buckets), '+Inf'], counts)
+                    ),
+                    count=sum(counts),
+                    sum_ms=round(total, 3),
+                )
+                for (method, route, phase), (counts, total) in sorted(
+                    self._series.items()
+                )
+            ]
+
+    def to_prometheus(self, name: str = 'agave_request_phase_ms') -> str:
+        lines = [f'# TYPE {name} histogram']
+        for series in self.snapshot():
+            labels = (
+                f'method="{series["method"]}",route="{series["route"]}",'
+                f'phase="{series["phase"]}"'
+            )
+            cumulative = 0
+            for bound, count in series['buckets'].items():
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_sum{{{labels}}} {series["sum_ms"]}')
+            lines.append(f'{name}_count{{{labels}}} {series["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+timing_histogram: Optional[TimingHistogram] = None
+
+
+def enable_timing_histogram(
+    buckets: tuple[float, ...] = HISTOGRAM_BUCKETS,
+) -> TimingHistogram:
+    global timing_histogram
+    timing_histogram = TimingHistogram(buckets)
+    return timing_histogram
+
+
+def disable_timing_histogram() -> None:
+    global timing_histogram
+    timing_histogram = None
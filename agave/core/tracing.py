@@ -0,0 +1,40 @@
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+from uuid import uuid4
+
+TRACE_ID_HEADER = 'x-request-id'
+TRACE_ID_ATTRIBUTE = 'agave-trace-id'
+
+trace_id: ContextVar[Optional[str]] = ContextVar('trace_id', default=None)
+
+
+def new_trace_id() -> str:
+    return uuid4().hex
+
+
+def trace_attributes() -> dict[str, Any]:
+    """
+    SQS message attributes with the trace id of the current request or
+    task, so the task that consumes the message logs the same id.
+    """
+    current = trace_id.get()
+    if current is None:
+        return {}
+    return {TRACE_ID_ATTRIBUTE: dict(DataType='String', StringValue=current)}
+
+
+def message_trace_id(message: dict) -> Optional[str]:
+    attribute = message.get('MessageAttributes', {}).get(TRACE_ID_ATTRIBUTE)
+    return attribute['StringValue'] if attribute else None
+
+
+def queue_wait_ms(message: dict) -> Optional[int]:
+    """
+    Time since the message was sent, from its `SentTimestamp`. Clock skew
+    between SQS and the worker could make it negative, so it is clamped.
+    """
+    sent = message.get('Attributes', {}).get('SentTimestamp')
+    if sent is None:
+        return None
+    return max(0, int(time.time() * 1000) - int(sent))
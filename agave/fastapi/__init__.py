@@ -1,3 +1,4 @@
+from .context import RequestContext, request_context
 from .rest_api import RestApiBlueprint
 
-__all__ = ['RestApiBlueprint']
+__all__ = ['RequestContext', 'RestApiBlueprint', 'request_context']
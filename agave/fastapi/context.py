@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from starlette_context import context as starlette_context
+
+
+@dataclass
+class RequestContext:
+    """
+    Identity of the current request. The auth layer of the app sets it and
+    `RestApiBlueprint` reads it. `extra` keeps app specific values, e.g.
+    the filters of a custom blueprint.
+    """
+
+    user_id: Optional[str] = None
+    platform_id: Optional[str] = None
+    api_key_id: Optional[str] = None
+    user_id_filter_required: bool = False
+    platform_id_filter_required: bool = False
+    extra: dict[str, Any] = field(default_factory=dict)
+
+
+request_context: ContextVar[Optional[RequestContext]] = ContextVar(
+    'request_context', default=None
+)
+
+
+@contextmanager
+def use_request_context(context: RequestContext) -> Iterator[RequestContext]:
+    token = request_context.set(context)
+    try:
+        yield context
+    finally:
+        request_context.reset(token)
+
+
+def get_request_context() -> RequestContext:
+    current = request_context.get()
+    if current is not None:
+        return current
+    # apps whose auth middleware still fills starlette-context, it raises
+    # ContextDoesNotExistError outside of its middleware
+    data = dict(starlette_context)
+    return RequestContext(
+        user_id=data.get('user_id'),
+        platform_id=data.get('platform_id'),
+        api_key_id=data.get('api_key_id'),
+        user_id_filter_required=data.get('user_id_filter_required', False),
+        platform_id_filter_required=data.get(
+            'platform_id_filter_required', False
+        ),
+        extra=data,
+    )
@@ -1,5 +1,9 @@
+from .admission import AdmissionController, AdmissionLimit, AdmissionMiddleware
 from .error_handlers import AgaveErrorHandler
 
 __all__ = [
+    'AdmissionController',
+    'AdmissionLimit',
+    'AdmissionMiddleware',
     'AgaveErrorHandler',
 ]
@@ -0,0 +1,149 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+
+from starlette._utils import get_route_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ...core.exc import ServiceUnavailableError
+from .error_handlers import error_response, path_segment
+
+DEFAULT_GROUP = 'default'
+
+
+@dataclass(frozen=True)
+class AdmissionLimit:
+    max_in_flight: int
+    max_queued: int = 0
+    queue_timeout: float = 1.0  # seconds
+
+
+class AdmissionGate:
+    """
+    Admits up to `max_in_flight` requests at once. The next `max_queued`
+    wait up to `queue_timeout` for a slot, the rest are rejected.
+    """
+
+    def __init__(self, limit: AdmissionLimit):
+        self.limit = limit
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(limit.max_in_flight)
+
+    async def acquire(self) -> bool:
+        if not self._slots.locked():
+            await self._slots.acquire()
+        elif self.queued >= self.limit.max_queued:
+            self.rejected += 1
+            return False
+        else:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(
+                    self._slots.acquire(), self.limit.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.queued -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+
+class AdmissionController:
+    """
+    Bounds the in-flight requests of the app. `groups` maps the first
+    segment of a path (usually a resource) to its own limit, every other
+    path shares the `default` one. `stats` and `to_prometheus` expose
+    the gauges of each group.
+    """
+
+    def __init__(
+        self,
+        default: AdmissionLimit,
+        groups: Optional[dict[str, AdmissionLimit]] = None,
+        retry_after: int = 1,
+    ):
+        self.default = default
+        self.groups = groups or {}
+        self.retry_after = retry_after
+        self._gates: dict[str, AdmissionGate] = {}
+
+    def group_of(self, scope: Scope) -> str:
+        segment = path_segment(get_route_path(scope))
+        return segment if segment in self.groups else DEFAULT_GROUP
+
+    def gate(self, group: str) -> AdmissionGate:
+        # created on first use, inside the event loop of the app
+        gate = self._gates.get(group)
+        if gate is None:
+            gate = self._gates[group] = AdmissionGate(
+                self.groups.get(group, self.default)
+            )
+        return gate
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            group: dict(
+                in_flight=gate.in_flight,
+                queued=gate.queued,
+                rejected=gate.rejected,
+            )
+            for group, gate in sorted(self._gates.items())
+        }
+
+    def to_prometheus(self, name: str = 'agave_admission') -> str:
+        stats = self.stats()
+        lines = []
+        for gauge, kind in (
+            ('in_flight', 'gauge'),
+            ('queued', 'gauge'),
+            ('rejected', 'counter'),
+        ):
+            lines.append(f'# TYPE {name}_{gauge} {kind}')
+            for group, values in stats.items():
+                lines.append(
+                    f'{name}_{gauge}{{group="{group}"}} {values[gauge]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+class AdmissionMiddleware:
+    """
+    Sheds load with a 503 and `Retry-After` once the group of the request
+    has no slot left, instead of piling up requests while the database is
+    slow. The slot is held until the response is sent.
+
+        controller = AdmissionController(AdmissionLimit(100, 200))
+        app.add_middleware(AdmissionMiddleware, controller=controller)
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        gate = self.controller.gate(self.controller.group_of(scope))
+        if not await gate.acquire():
+            exc = ServiceUnavailableError(
+                'Service overloaded, try again later',
+                retry_after=self.controller.retry_after,
+            )
+            await error_response(exc)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
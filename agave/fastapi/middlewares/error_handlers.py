@@ -1,38 +1,156 @@
+from typing import Optional, Union
+
 from cuenca_validations.errors import CuencaError
-from fastapi import Request, Response
+from fastapi import Request
 from fastapi.responses import JSONResponse
-from fastapi.routing import APIRoute
-from starlette.middleware.base import (
-    BaseHTTPMiddleware,
-    RequestResponseEndpoint,
-)
-from starlette.routing import Match
+from starlette._utils import get_route_path
+from starlette.applications import Starlette
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from ...core.exc import AgaveError, MethodNotAllowedError, NotFoundError
 
 
-class AgaveErrorHandler(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
+class AgaveErrorHandler:
+    """
+    Returns `CuencaError` and `AgaveError` as JSON responses.
+
+    It is a plain ASGI middleware: unlike `BaseHTTPMiddleware` it does not
+    run the app in another task nor pipe the response through a memory
+    stream, so streaming responses are sent as they are produced.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message['type'] == 'http.response.start':
+                response_started = True
+            await send(message)
+
         try:
-            request.scope['route_handler'] = get_current_route_handler(request)
-            return await call_next(request)
-        except CuencaError as exc:
-            return JSONResponse(
-                status_code=exc.status_code,
-                content=dict(
-                    code=exc.code,
-                    error=str(exc),
-                ),
-            )
-        except AgaveError as exc:
-            return JSONResponse(
-                status_code=exc.status_code, content=dict(error=exc.error)
-            )
-
-
-def get_current_route_handler(request: Request) -> APIRoute:
+            scope['route_handler'] = get_current_route_handler(Request(scope))
+            await self.app(scope, receive, send_wrapper)
+        except (CuencaError, AgaveError) as exc:
+            # the status was already sent, nothing left to replace
+            if response_started:
+                raise
+            await error_response(exc)(scope, receive, send)
+
+
+def error_response(exc: Union[CuencaError, AgaveError]) -> JSONResponse:
+    if isinstance(exc, CuencaError):
+        return JSONResponse(
+            status_code=exc.status_code,
+            content=dict(
+                code=exc.code,
+                error=str(exc),
+            ),
+        )
+    headers = None
+    # TooManyRequests and ServiceUnavailableError
+    retry_after = getattr(exc, 'retry_after', None)
+    if retry_after:
+        headers = {'Retry-After': str(retry_after)}
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=dict(error=exc.error),
+        headers=headers,
+    )
+
+
+class RouteIndex:
+    """
+    Routes of an app grouped by the static first segment of their path and
+    by method. The groups keep the order of the routes, so the first match
+    is the same one starlette's router finds. Routes whose first segment
+    has a parameter are candidates for every path.
+    """
+
+    def __init__(self, routes: list[BaseRoute]):
+        self.routes = routes
+        self.size = len(routes)
+        keyed = [(route_segment(route), route) for route in routes]
+        self.segments = {key for key, _ in keyed if key is not None}
+        self.candidates = {
+            key: [route for k, route in keyed if k is None or k == key]
+            for key in [*self.segments, None]
+        }
+        methods = {
+            method
+            for route in routes
+            for method in getattr(route, 'methods', None) or ()
+        }
+        self.by_method = {
+            (key, method): [
+                route
+                for route in candidates
+                if method in (getattr(route, 'methods', None) or {method})
+            ]
+            for key, candidates in self.candidates.items()
+            for method in methods
+        }
+        # routes of any method, like mounts and websockets
+        self.methodless = {
+            key: [
+                route
+                for route in candidates
+                if not getattr(route, 'methods', None)
+            ]
+            for key, candidates in self.candidates.items()
+        }
+
+    def is_stale(self, routes: list[BaseRoute]) -> bool:
+        return routes is not self.routes or len(routes) != self.size
+
+    def resolve(self, scope: Scope) -> BaseRoute:
+        key: Optional[str] = path_segment(get_route_path(scope))
+        if key not in self.segments:
+            key = None
+        method = scope['method']
+        routes = self.by_method.get((key, method), self.methodless[key])
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        for route in self.candidates[key]:
+            match, _ = route.matches(scope)
+            if match == Match.PARTIAL:
+                raise MethodNotAllowedError('Method Not Allowed')
+        raise NotFoundError('Not Found')
+
+
+def path_segment(path: str) -> str:
+    return path[1:].split('/', 1)[0]
+
+
+def route_segment(route: BaseRoute) -> Optional[str]:
+    path = getattr(route, 'path', '')
+    if not path.startswith('/'):
+        return None
+    segment = path_segment(path)
+    return None if '{' in segment else segment
+
+
+def get_route_index(app: Starlette) -> RouteIndex:
+    """Index of the routes of the app, built again when they change"""
+    index = getattr(app.state, 'agave_route_index', None)
+    if index is None or index.is_stale(app.routes):
+        index = app.state.agave_route_index = RouteIndex(app.routes)
+    return index
+
+
+def get_current_route_handler(request: Request) -> BaseRoute:
     """
     Helper method for getting the route handler of the current request.
 
@@ -43,17 +161,6 @@ def get_current_route_handler(request: Request) -> APIRoute:
         request: fastapi request object
 
     Returns:
-        APIRoute instance for the current request
+        Route instance for the current request
     """
-    partial = None
-    for route in request.app.routes:
-        match, _ = route.matches(request.scope)
-        if match == Match.FULL:
-            return route
-        if match == Match.PARTIAL and partial is None:
-            partial = route
-
-    if partial is not None:
-        raise MethodNotAllowedError('Method Not Allowed')
-    else:
-        raise NotFoundError('Not Found')
+    return get_route_index(request.app).resolve(request.scope)
@@ -1,15 +1,31 @@
 import json
 import logging
+import time
 from json import JSONDecodeError
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 from cuenca_validations.errors import CuencaError
-from fastapi import HTTPException, Request, Response
+from cuenca_validations.types import LogConfig
+from fastapi import HTTPException, Request, Response, params
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRoute
+from starlette.datastructures import UploadFile
 
+from ...core import timing
 from ...core.exc import AgaveError
-from ...core.loggers import HEADERS_LOG_CONFIG, obfuscate_sensitive_data
+from ...core.log_sink import log_sink
+from ...core.loggers import (
+    SAMPLED_OUT,
+    log_headers,
+    obfuscate_sensitive_data,
+    sample_bodies,
+    truncate_body,
+)
+from ...core.timing import RequestTimer, request_timer
+from ...core.tracing import TRACE_ID_HEADER, new_trace_id, trace_id
+from ..responses import AgaveJSONResponse
+from .utils import is_json_content
 
 logging.basicConfig(level=logging.INFO)
 
@@ -28,43 +44,141 @@ def get_exception_status_and_detail(exc: Exception) -> tuple[int, str]:
     return 500, str(exc)
 
 
+def response_content(response: Response) -> Any:
+    if isinstance(response, AgaveJSONResponse):
+        return response.content
+    body = getattr(response, 'body', None)
+    if not body or not response.media_type:
+        return None
+    if not is_json_content(response.media_type):
+        return None
+    return json.loads(body)
+
+
+def obfuscate_body(
+    body: Any, sensitive_fields: Optional[dict[str, LogConfig]]
+) -> Any:
+    if not sensitive_fields or not isinstance(body, dict):
+        return body
+    return obfuscate_sensitive_data(body, sensitive_fields)
+
+
+def content_length(headers: Any) -> Optional[int]:
+    length = headers.get('content-length')
+    return int(length) if length and length.isdigit() else None
+
+
+def upload_metadata(request: Request) -> dict[str, Any]:
+    # the form parsed by the endpoint, if it got that far
+    form = getattr(request, '_form', None)
+    files = [
+        dict(
+            field=name,
+            filename=value.filename,
+            content_type=value.content_type,
+            size=value.size,
+        )
+        for name, value in (form.multi_items() if form else [])
+        if isinstance(value, UploadFile)
+    ]
+    return dict(
+        content_type=request.headers.get('content-type'),
+        size=content_length(request.headers),
+        files=files,
+    )
+
+
+def download_metadata(response: Response) -> dict[str, Any]:
+    disposition = response.headers.get('content-disposition', '')
+    return dict(
+        content_type=response.media_type,
+        size=content_length(response.headers),
+        filename=disposition.partition('filename=')[2] or None,
+    )
+
+
+def log_body(
+    log_data: dict[str, Any],
+    part: str,
+    body: Any,
+    max_size: Optional[int],
+    size: Optional[int],
+) -> None:
+    body, note = truncate_body(body, max_size, size)
+    log_data[part]['body'] = body
+    if note:
+        log_data.setdefault('skipped', {})[f'{part}.body'] = note
+
+
 class LoggingRoute(APIRoute):
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # form and file params are parsed by FastAPI from the stream, the
+        # blueprint marks its own upload and download routes on the
+        # endpoint
+        self.form_body = self.body_field is not None and isinstance(
+            self.body_field.field_info, params.Form
+        )
+
     def get_route_handler(self) -> Callable:
         original_route_handler = super().get_route_handler()
 
         async def logging_route_handler(request: Request) -> Response:
 
+            timer = RequestTimer()
+            timer_token = request_timer.set(timer)
+            # the messages sent to SQS while handling the request carry it
+            trace_token = trace_id.set(
+                request.headers.get(TRACE_ID_HEADER) or new_trace_id()
+            )
             req_handler = request.scope['route_handler']
-
-            try:
-                ofuscated_request_body = obfuscate_sensitive_data(
-                    await request.json(),
-                    req_handler.endpoint.request_log_config_fields,
-                )
-            except AttributeError:
-                ofuscated_request_body = await request.json()
-            except JSONDecodeError:
-                ofuscated_request_body = None
+            # set by RestApiBlueprint from the settings of the resource
+            sample_rate = getattr(self.endpoint, 'log_sample_rate', 1.0)
+            max_body_size = getattr(self.endpoint, 'log_max_body_size', None)
+
+            streaming_request = self.form_body or getattr(
+                self.endpoint, 'streaming_request', False
+            )
+            raw_body = b'' if streaming_request else await request.body()
+            ofuscated_request_body = None
+            if raw_body and is_json_content(
+                request.headers.get('content-type')
+            ):
+                try:
+                    # starlette caches it, the endpoint reuses this parse
+                    ofuscated_request_body = obfuscate_body(
+                        await request.json(),
+                        getattr(
+                            req_handler.endpoint,
+                            'request_log_config_fields',
+                            None,
+                        ),
+                    )
+                except JSONDecodeError:
+                    pass
 
             log_data: dict[str, Any] = {
+                'trace_id': trace_id.get(),
                 'request': {
                     'method': request.method,
                     'url': str(request.url),
                     'query_params': request.query_params,
-                    'headers': obfuscate_sensitive_data(
-                        dict(request.headers),
-                        HEADERS_LOG_CONFIG,
-                    ),
-                    'body': ofuscated_request_body,
-                }
+                    'headers': log_headers(request.headers.items()),
+                    'body': None,
+                },
             }
+            # errors are always logged with their bodies
+            log_bodies = True
+            timer.add('read_body', timer.elapsed())
 
             response: Response
 
+            handler_start = log_start = time.perf_counter()
             try:
                 response = await original_route_handler(request)
             except Exception as exc:
+                log_start = time.perf_counter()
                 status_code, error_detail = get_exception_status_and_detail(
                     exc
                 )
@@ -74,29 +188,64 @@ class LoggingRoute(APIRoute):
                 }
                 raise
             else:
-
-                if hasattr(response, 'body'):
-                    try:
-                        ofuscated_response_body = obfuscate_sensitive_data(
-                            json.loads(response.body),
-                            req_handler.endpoint.response_log_config_fields,
-                        )
-                    except AttributeError:
-                        ofuscated_response_body = json.loads(response.body)
-                else:
-                    ofuscated_response_body = None
-
+                log_start = time.perf_counter()
                 log_data['response'] = {
                     'status_code': response.status_code,
-                    'headers': obfuscate_sensitive_data(
-                        dict(response.headers),
-                        HEADERS_LOG_CONFIG,
-                    ),
-                    'body': ofuscated_response_body,
+                    'headers': log_headers(response.headers.items()),
+                    'body': None,
                 }
-
+                log_bodies = response.status_code >= 400 or sample_bodies(
+                    sample_rate
+                )
+                if isinstance(response, StreamingResponse) or getattr(
+                    self.endpoint, 'streaming_response', False
+                ):
+                    log_data['response']['stream'] = download_metadata(
+                        response
+                    )
+                elif log_bodies:
+                    log_body(
+                        log_data,
+                        'response',
+                        obfuscate_body(
+                            response_content(response),
+                            getattr(
+                                req_handler.endpoint,
+                                'response_log_config_fields',
+                                None,
+                            ),
+                        ),
+                        max_body_size,
+                        len(getattr(response, 'body', b'')),
+                    )
             finally:
-                logger.info(json.dumps(log_data, default=str))
+                if streaming_request:
+                    log_data['request']['stream'] = upload_metadata(request)
+                if log_bodies:
+                    log_body(
+                        log_data,
+                        'request',
+                        ofuscated_request_body,
+                        max_body_size,
+                        len(raw_body),
+                    )
+                else:
+                    log_data['skipped'] = {
+                        'request.body': SAMPLED_OUT,
+                        'response.body': SAMPLED_OUT,
+                    }
+                explain = getattr(request.state, 'explain', None)
+                if explain:
+                    log_data['explain'] = explain
+                timer.add('handler', log_start - handler_start)
+                timer.add('log', time.perf_counter() - log_start)
+                log_data['timings'] = timings = timer.as_dict()
+                log_sink.emit(logger, log_data)
+                request_timer.reset(timer_token)
+                trace_id.reset(trace_token)
+                histogram = timing.timing_histogram
+                if histogram:
+                    histogram.observe(request.method, self.path, timings)
 
             return response
 
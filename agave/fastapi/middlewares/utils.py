@@ -1,3 +1,5 @@
+from typing import Optional
+
 from fastapi import Request
 
 
@@ -14,3 +16,14 @@ def get_source_ip(request: Request) -> str:
         ip_address = request.client.host if request.client else 'NA'
 
     return ip_address
+
+
+def is_json_content(content_type: Optional[str]) -> bool:
+    # Same rule FastAPI uses to decode a body: no content type or
+    # application/json and application/*+json
+    if not content_type:
+        return True
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type == 'application/json' or (
+        media_type.startswith('application/') and media_type.endswith('+json')
+    )
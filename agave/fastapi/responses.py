@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from ..core.encoders import render
+from ..core.timing import timed
+
+
+class AgaveJSONResponse(JSONResponse):
+    """
+    JSONResponse that keeps the content it rendered, `LoggingRoute` logs it
+    without decoding the body that was just encoded. The body is encoded
+    with the configured encoder, see `agave.core.encoders`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        self.content = content
+        with timed('serialize'):
+            return render(content)
@@ -1,28 +1,76 @@
 import asyncio
+import logging
 import mimetypes
-from typing import Any, Optional
+from typing import Any, AsyncGenerator, Iterator, Optional, get_type_hints
 from urllib.parse import urlencode
 
 from cuenca_validations.types import QueryParams
 
-from ..core.loggers import get_request_model, get_sensitive_fields
+from ..core.loggers import (
+    get_request_model,
+    get_sensitive_fields,
+    route_log_setting,
+)
 from .middlewares.loggin_route import LoggingRoute
 
 try:
-    from fastapi import APIRouter, BackgroundTasks, Depends, Request, status
+    from fastapi import (
+        APIRouter,
+        BackgroundTasks,
+        Depends,
+        Query,
+        Request,
+        Response as BaseResponse,
+        status,
+    )
 except ImportError:
     raise ImportError(
         "You must install agave with [fastapi] option.\n"
         "You can install it with: pip install agave[fastapi]"
     )
 
-from fastapi.responses import JSONResponse as Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from mongoengine import DoesNotExist, Q
-from pydantic import BaseModel, Field, ValidationError
-from starlette_context import context
+from mongoengine_plus.aio.utils import create_awaitable
+from pydantic import BaseModel, Field, ValidationError, create_model
 
+from ..core.batch import BATCH_MAX_IDS, parse_ids
 from ..core.blueprints.decorators import copy_attributes
+from ..core.counts import CountCache, can_estimate_count, clear_cache_after
+from ..core.encoders import dumps
+from ..core.etags import etag_matches, make_etag
 from ..core.exc import NotFoundError, UnprocessableEntity
+from ..core.indexes import (
+    explain_query,
+    index_report,
+    log_index_report,
+    should_explain,
+)
+from ..core.pagination import (
+    CURSOR_ORDER,
+    Cursor,
+    cursor_query,
+    decode_cursor,
+    encode_cursor,
+)
+from ..core.projection import (
+    output_fields,
+    parse_fields,
+    project,
+    projection_fields,
+    serialize_projection,
+)
+from ..core.rate_limit import RateLimiter
+from ..core.raw_documents import raw_converter
+from ..core.timing import timed, timed_call
+from .context import RequestContext, get_request_context
+from .responses import AgaveJSONResponse as Response
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
 
 SAMPLE_404 = {
     "summary": "Not found item",
@@ -33,25 +81,30 @@ SAMPLE_404 = {
 class RestApiBlueprint(APIRouter):
 
     def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default_response_class', Response)
         super().__init__(*args, route_class=LoggingRoute, **kwargs)
 
     @property
-    def current_user_id(self) -> str:
-        return context['user_id']
+    def context(self) -> RequestContext:
+        return get_request_context()
+
+    @property
+    def current_user_id(self) -> Optional[str]:
+        return self.context.user_id
 
     @property
-    def current_platform_id(self) -> str:
-        return context['platform_id']
+    def current_platform_id(self) -> Optional[str]:
+        return self.context.platform_id
 
     @property
-    def current_api_key_id(self) -> str:
-        return context['api_key_id']
+    def current_api_key_id(self) -> Optional[str]:
+        return self.context.api_key_id
 
     def user_id_filter_required(self) -> bool:
-        return context['user_id_filter_required']
+        return self.context.user_id_filter_required
 
     def platform_id_filter_required(self) -> bool:
-        return context['platform_id_filter_required']
+        return self.context.platform_id_filter_required
 
     def custom_filter_required(self, query_params: Any, model: Any) -> None:
         """
@@ -61,13 +114,27 @@ class RestApiBlueprint(APIRouter):
         """
         pass
 
-    async def retrieve_object(
-        self, resource_class: Any, resource_id: str
-    ) -> Any:
-        resource_id = (
-            self.current_user_id if resource_id == 'me' else resource_id
+    def rate_limit_key(self) -> Optional[str]:
+        """Bucket of the current request: its api key, or its platform"""
+        return self.current_api_key_id or self.current_platform_id
+
+    async def check_rate_limit(
+        self, resource_class: Any, route: str, query: Any = None
+    ) -> None:
+        limiter: Optional[RateLimiter] = getattr(
+            resource_class, 'rate_limit', None
         )
-        query = Q(id=resource_id)
+        key = self.rate_limit_key()
+        if limiter is None or key is None:
+            return
+        await limiter.async_check(key, limiter.cost(route, query))
+
+    def resource_id(self, resource_id: str) -> str:
+        user_id = self.current_user_id
+        return user_id if resource_id == 'me' and user_id else resource_id
+
+    def scope_query(self, resource_class: Any, query: Q) -> Q:
+        """Restricts `query` to the objects the current user can access"""
         if self.platform_id_filter_required() and hasattr(
             resource_class.model, 'platform_id'
         ):
@@ -77,13 +144,50 @@ class RestApiBlueprint(APIRouter):
             resource_class.model, 'user_id'
         ):
             query = query & Q(user_id=self.current_user_id)
+        return query
 
+    async def retrieve_object(
+        self,
+        resource_class: Any,
+        resource_id: str,
+        only: Optional[list[str]] = None,
+        as_pymongo: bool = False,
+    ) -> Any:
+        query = self.scope_query(
+            resource_class, Q(id=self.resource_id(resource_id))
+        )
+        query_set = resource_class.model.objects
+        if only:
+            query_set = query_set.only(*only)
+        if as_pymongo:
+            query_set = query_set.as_pymongo()
         try:
-            data = await resource_class.model.objects.async_get(query)
+            with timed('db'):
+                data = await query_set.async_get(query)
         except DoesNotExist:
             raise NotFoundError('Not valid id')
         return data
 
+    async def retrieve_objects(
+        self,
+        resource_class: Any,
+        resource_ids: list[str],
+        as_pymongo: bool = False,
+    ) -> list:
+        """
+        Same as `retrieve_object` for several ids with a single `$in`
+        query, the ids that are not found are simply not returned.
+        """
+        query = self.scope_query(
+            resource_class,
+            Q(id__in=[self.resource_id(i) for i in resource_ids]),
+        )
+        query_set = resource_class.model.objects.filter(query)
+        if as_pymongo:
+            query_set = query_set.as_pymongo()
+        with timed('db'):
+            return await query_set.async_to_list()
+
     def resource(self, path: str):
         """Decorator to transform a class in FastApi REST endpoints
 
@@ -92,6 +196,15 @@ class RestApiBlueprint(APIRouter):
             model = MyMongoModel
             response_model = MyPydanticModel (Resource Interface)
             query_validator = MyPydanticModel
+            cursor_pagination = True  # Optional, keyset pagination
+            count_cache_ttl = 60  # Optional, seconds to cache counts
+            raw_documents = True  # Optional, skip building Documents
+            etag_field = 'updated_at'  # Optional, version for the ETag
+            explain_sample_rate = 0.01  # Optional, log explain() of queries
+            query_lookups = dict(total=async_fn)  # Optional, see below
+            log_sample_rate = dict(query=0.1)  # Optional, see below
+            log_max_body_size = 10_000  # Optional, see below
+            rate_limit = RateLimiter(10, 50)  # Optional, see below
 
             def create(): ...
             def delete(id): ...
@@ -103,10 +216,68 @@ class RestApiBlueprint(APIRouter):
         POST /my_resource
         PATCH /my_resource
         DELETE /my_resource/id
+        GET /my_resource/batch?ids=id1,id2  # without custom retrieve
         GET /my_resource/id
         GET /my_resource
+
+        With `raw_documents` the default retrieve and query endpoints read
+        raw documents and convert them with the same rules as `to_dict`,
+        which is much cheaper than building every `Document`. Only enable
+        it when the model does not override `to_dict`.
+
+        The default retrieve sends a strong `ETag` and answers `304 Not
+        Modified` to a matching `If-None-Match`. The ETag is a hash of the
+        content unless `etag_field` names a field that changes on every
+        update (a version or `updated_at`), then it is checked by reading
+        only that field.
+
+        When the resource is registered its query access patterns (tenant
+        filters, `query_validator` fields and sort) are compared with the
+        indexes of the model and every missing index is logged as a
+        warning, see `cls.index_report`. With `explain_sample_rate` that
+        fraction of the queries is explained and the summary is logged
+        together with the request.
+
+        `query_lookups` maps names to async functions that receive the
+        query params and the filters. They run concurrently with the page
+        query and their results are added to the query response under
+        their names (documented with their return annotation) before
+        calling the custom "query" method.
+
+        GET endpoints accept a `fields` param with a comma separated list of
+        `response_model` fields to return (retrieve only when it is not
+        customized with "retrieve" or "download"). The projection is pushed
+        down to Mongo whenever the fields map to model fields.
+
+        `log_sample_rate` is the fraction of successful calls logged with
+        their request and response bodies (errors always include them) and
+        `log_max_body_size` caps the logged JSON of a body. Both take a
+        single value or a dict by route name (`create`, `upload`,
+        `retrieve`, `batch_retrieve`, `query`, `update` and `delete`).
+
+        With `rate_limit` every call takes tokens from the bucket of the
+        api key (or platform) of the request, see `RateLimiter`. Calls
+        without tokens left get a 429 with a `Retry-After` header before
+        their params are validated, except queries whose cost depends on
+        them.
         """
 
+        def register_resource(cls):
+            first_route = len(self.routes)
+            wrapper_resource_class(cls)
+            sample_rate = getattr(cls, 'log_sample_rate', None)
+            max_body_size = getattr(cls, 'log_max_body_size', None)
+            for route in self.routes[first_route:]:
+                if not isinstance(route, LoggingRoute):
+                    continue
+                route.endpoint.log_sample_rate = route_log_setting(
+                    sample_rate, route.name, 1.0
+                )
+                route.endpoint.log_max_body_size = route_log_setting(
+                    max_body_size, route.name, None
+                )
+            return cls
+
         def wrapper_resource_class(cls):
             """Wrapper for resource class
             :param cls: Resoucre class
@@ -115,9 +286,71 @@ class RestApiBlueprint(APIRouter):
             response_model = Any
             response_sample = {}
             include_in_schema = getattr(cls, 'include_in_schema', True)
+            cursor_pagination = getattr(cls, 'cursor_pagination', False)
+            projectable_fields = {name: name for name in cls.model._fields}
+            projectable_fields['id'] = 'id'
             if hasattr(cls, 'response_model'):
                 response_model = cls.response_model
                 response_sample = response_model.schema().get('example')
+                projectable_fields = output_fields(response_model)
+            fields_description = (
+                'Comma separated list of fields to include in the response'
+            )
+
+            count_cache: Optional[CountCache] = None
+            if getattr(cls, 'count_cache_ttl', None):
+                count_cache = cls.count_cache = CountCache(cls.count_cache_ttl)
+
+            def invalidate_counts() -> None:
+                if count_cache:
+                    count_cache.clear()
+
+            rate_limit = getattr(cls, 'rate_limit', None)
+
+            def rate_limited(route_name: str) -> list:
+                if not rate_limit:
+                    return []
+
+                async def check_rate_limit() -> None:
+                    await self.check_rate_limit(cls, route_name)
+
+                return [Depends(check_rate_limit)]
+
+            raw_documents = getattr(cls, 'raw_documents', False)
+            convert_raw = raw_converter(cls.model) if raw_documents else None
+
+            def to_dict(item: Any) -> dict:
+                return convert_raw(item) if convert_raw else item.to_dict()
+
+            def object_id(item: Any, raw: bool = False) -> str:
+                return str(item['_id'] if raw or convert_raw else item.pk)
+
+            etag_field = getattr(cls, 'etag_field', None)
+
+            def version_of(item: Any) -> Any:
+                if not isinstance(item, dict):
+                    return getattr(item, etag_field)
+                field = cls.model._fields[etag_field]
+                value = item.get(field.db_field)
+                return value if value is None else field.to_python(value)
+
+            def sort_key(item: Any) -> Cursor:
+                if convert_raw:
+                    return Cursor(item['created_at'], item['_id'])
+                return Cursor(item.created_at, item.pk)
+
+            def only_fields(projection: list[str]) -> Optional[list[str]]:
+                return projection_fields(
+                    cls.model, [projectable_fields[f] for f in projection]
+                )
+
+            def serialize(items: list[dict], projection: list[str]) -> list:
+                if response_model is Any:
+                    return [project(item, projection) for item in items]
+                return [
+                    serialize_projection(response_model, item, projection)
+                    for item in items
+                ]
 
             """ POST /resource
             Create a FastApi endpoint using the method "create"
@@ -133,6 +366,7 @@ class RestApiBlueprint(APIRouter):
                     response_model=response_model,
                     status_code=status.HTTP_201_CREATED,
                     include_in_schema=include_in_schema,
+                    dependencies=rate_limited('create'),
                 )
 
                 request_model = get_request_model(cls.create)
@@ -144,7 +378,16 @@ class RestApiBlueprint(APIRouter):
                     response_model
                 )
 
-                route(cls.create)
+                route(
+                    timed_call(
+                        (
+                            clear_cache_after(cls.create, count_cache)
+                            if count_cache
+                            else cls.create
+                        ),
+                        'resource',
+                    )
+                )
             elif hasattr(cls, 'upload'):
 
                 @self.post(
@@ -152,6 +395,7 @@ class RestApiBlueprint(APIRouter):
                     summary=f'{cls.__name__} - Upload',
                     response_model=response_model,
                     include_in_schema=include_in_schema,
+                    dependencies=rate_limited('upload'),
                     openapi_extra={
                         "requestBody": {
                             "content": {
@@ -172,7 +416,16 @@ class RestApiBlueprint(APIRouter):
                     except ValidationError as exc:
                         return Response(content=exc.json(), status_code=400)
 
-                    return await cls.upload(upload_params, background_tasks)
+                    try:
+                        with timed('resource'):
+                            return await cls.upload(
+                                upload_params, background_tasks
+                            )
+                    finally:
+                        invalidate_counts()
+
+                # LoggingRoute logs metadata instead of buffering the files
+                upload.streaming_request = True
 
             """ DELETE /resource/{id}
             Use "delete" method (if exists) to create the FastApi endpoint
@@ -189,11 +442,16 @@ class RestApiBlueprint(APIRouter):
                         f'Use id param to delete the {cls.__name__} object'
                     ),
                     include_in_schema=include_in_schema,
+                    dependencies=rate_limited('delete'),
                 )
                 @copy_attributes(cls)
                 async def delete(id: str, request: Request):
                     obj = await self.retrieve_object(cls, id)
-                    return await cls.delete(obj, request)
+                    try:
+                        with timed('resource'):
+                            return await cls.delete(obj, request)
+                    finally:
+                        invalidate_counts()
 
             """ PATCH /resource/{id}
             Enable PATCH method if Resource.update method exist. It validates
@@ -220,6 +478,7 @@ class RestApiBlueprint(APIRouter):
                         f'Use id param to update the {cls.__name__} object'
                     ),
                     include_in_schema=include_in_schema,
+                    dependencies=rate_limited('update'),
                 )
                 @copy_attributes(cls)
                 async def update(
@@ -229,15 +488,91 @@ class RestApiBlueprint(APIRouter):
                 ):
                     obj = await self.retrieve_object(cls, id)
                     try:
-                        return await cls.update(obj, update_params, request)
+                        with timed('resource'):
+                            return await cls.update(
+                                obj, update_params, request
+                            )
                     except TypeError:
-                        return await cls.update(obj, update_params)
+                        with timed('resource'):
+                            return await cls.update(obj, update_params)
+                    finally:
+                        invalidate_counts()
+
+            # batches and projections only apply to the default `to_dict`
+            custom_retrieve = hasattr(cls, 'retrieve') or hasattr(
+                cls, 'download'
+            )
+
+            """ GET /resource/batch?ids=id1,id2
+            Retrieve several objects with a single query. It is only
+            created when "retrieve" and "download" are not customized and
+            it has to be registered before "/{id}" to not be shadowed.
+            """
+            if not custom_retrieve:
+
+                class BatchResponse(BaseModel):
+                    items: list[response_model] = Field(  # type: ignore
+                        description=f'{cls.__name__} objects found'
+                    )
+                    missing_ids: list[str] = Field(
+                        description=(
+                            'Requested ids that do not exist or are not '
+                            'accessible'
+                        )
+                    )
+
+                BatchResponse.__name__ = f'BatchResponse{cls.__name__}'
+
+                @self.get(
+                    path + '/batch',
+                    summary=f'{cls.__name__} - Batch Retrieve',
+                    response_model=BatchResponse,
+                    description=(
+                        f'Use ids param to retrieve up to {BATCH_MAX_IDS} '
+                        f'{cls.__name__} objects in a single request'
+                    ),
+                    include_in_schema=include_in_schema,
+                    dependencies=rate_limited('batch_retrieve'),
+                )
+                @copy_attributes(cls)
+                async def batch_retrieve(
+                    ids: str = Query(
+                        ..., description='Comma separated list of ids'
+                    ),
+                ):
+                    resource_ids = parse_ids(ids)
+                    objs = await self.retrieve_objects(
+                        cls, resource_ids, raw_documents
+                    )
+                    found = {object_id(obj): obj for obj in objs}
+                    items, missing_ids = [], []
+                    for resource_id in resource_ids:
+                        obj = found.get(self.resource_id(resource_id))
+                        if obj is None:
+                            missing_ids.append(resource_id)
+                        else:
+                            items.append(to_dict(obj))
+                    return dict(items=items, missing_ids=missing_ids)
+
+                batch_retrieve.response_log_config_fields = (
+                    get_sensitive_fields(BatchResponse)
+                )
 
             """ GET /resource/{id}
             By default GET method only fetch object from DB.
             If you need extra logic override "retrieve" or "download" methods
             """
 
+            def retrieve_fields(
+                fields: Optional[str] = Query(
+                    None, description=fields_description
+                )
+            ) -> Optional[list[str]]:
+                return parse_fields(fields, projectable_fields)
+
+            def no_fields() -> None:
+                return None
+
             @self.get(
                 path + '/{id}',
                 summary=f'{cls.__name__} - Retrieve',
@@ -247,9 +582,17 @@ class RestApiBlueprint(APIRouter):
                     f'Use id param to retrieve the {cls.__name__} object'
                 ),
                 include_in_schema=include_in_schema,
+                dependencies=rate_limited('retrieve'),
             )
             @copy_attributes(cls)
-            async def retrieve(id: str, request: Request):
+            async def retrieve(
+                id: str,
+                request: Request,
+                response: BaseResponse,
+                projection: Optional[list[str]] = Depends(
+                    no_fields if custom_retrieve else retrieve_fields
+                ),
+            ):
                 """GET /resource/{id}
                 :param id: Object Id
                 :return: Model object
@@ -261,12 +604,21 @@ class RestApiBlueprint(APIRouter):
                 The most of times this implementation is enough and is not
                 necessary define a custom "retrieve" method
                 """
+                if not custom_retrieve:
+                    return await _retrieve_item(
+                        id,
+                        request.headers.get('if-none-match'),
+                        response,
+                        projection,
+                    )
+
                 obj = await self.retrieve_object(cls, id)
 
                 # This case is when the return is not an application/$
                 # but can be some type of file such as image, xml, zip or pdf
                 if hasattr(cls, 'download'):
-                    file = await cls.download(obj)
+                    with timed('resource'):
+                        file = await cls.download(obj)
                     mimetype = request.headers['accept']
                     extension = mimetypes.guess_extension(mimetype)
                     filename = f'{cls.model._class_name}.{extension}'
@@ -279,13 +631,62 @@ class RestApiBlueprint(APIRouter):
                             )
                         },
                     )
-                elif hasattr(cls, 'retrieve'):
-                    result = await cls.retrieve(obj)
                 else:
-                    result = obj.to_dict()
+                    with timed('resource'):
+                        result = await cls.retrieve(obj)
 
                 return result
 
+            async def _retrieve_item(
+                id: str,
+                if_none_match: Optional[str],
+                response: BaseResponse,
+                projection: Optional[list[str]] = None,
+            ):
+                """
+                Default retrieve with a strong `ETag`. With `etag_field` the
+                ETag derives from the document version, so when the client
+                sends `If-None-Match` only that field is read to answer
+                `304`. Otherwise it is a hash of the content and `304` only
+                saves the response rendering and the bandwidth.
+                """
+                only = only_fields(projection) if projection else None
+                if etag_field:
+                    if if_none_match:
+                        version = await self.retrieve_object(
+                            cls, id, [etag_field], as_pymongo=True
+                        )
+                        etag = make_etag(
+                            object_id(version, raw=True),
+                            version_of(version),
+                            projection,
+                        )
+                        if etag_matches(if_none_match, etag):
+                            return not_modified(etag)
+                    if only:
+                        only.append(etag_field)
+
+                obj = await self.retrieve_object(cls, id, only, raw_documents)
+                item = to_dict(obj)
+                if projection:
+                    [item] = serialize([item], projection)
+                if etag_field:
+                    etag = make_etag(
+                        object_id(obj), version_of(obj), projection
+                    )
+                else:
+                    etag = make_etag(item, projection)
+                    if etag_matches(if_none_match, etag):
+                        return not_modified(etag)
+
+                if projection:
+                    return Response(
+                        content=jsonable_encoder(item), headers={'ETag': etag}
+                    )
+                response.headers['ETag'] = etag
+                return item
+
+            retrieve.streaming_response = hasattr(cls, 'download')
             retrieve.response_log_config_fields = get_sensitive_fields(
                 response_model
             )
@@ -306,13 +707,29 @@ class RestApiBlueprint(APIRouter):
             ):
                 return cls
 
+            query_order = (
+                CURSOR_ORDER if cursor_pagination else ('-created_at',)
+            )
+            cls.index_report = index_report(
+                cls.model, cls.query_validator.model_fields, query_order
+            )
+            log_index_report(cls.__name__, cls.index_report)
+
             query_description = (
                 f'Make queries in resource {cls.__name__} and filter the '
                 f'result using query parameters.  \n'
                 f'The items are paginated, to iterate over them use the '
                 f'`next_page_uri` included in response.  \n'  # noqa: W604
                 f'If you need only a counter not the data send value `true` '
-                f'in `count` param.'
+                f'in `count` param. Counts without filters are estimated from '
+                f'the collection metadata and counts served from cache may '
+                f'be stale, both are flagged with `approximate`.  \n'
+                f'Send the `Accept: {NDJSON_MEDIA_TYPE}` header to stream '
+                f'every matching item as newline delimited JSON instead of '
+                f'paginating. `page_size` and `cursor` are ignored while '
+                f'streaming, `limit` still caps the number of items. If the '
+                f'stream fails after it started the last line is an '
+                f'`{{"error": ...}}` object.'
             )
 
             # Build dynamically types for query response
@@ -336,9 +753,27 @@ class RestApiBlueprint(APIRouter):
                         f'`true` in `count` param.'  # noqa: W604
                     ),
                 )
+                approximate: Optional[bool] = Field(
+                    None,
+                    description=(
+                        'True when `count` was estimated or read from cache '
+                        'instead of counted'
+                    ),
+                )
 
             QueryResponse.__name__ = f'QueryResponse{cls.__name__}'
 
+            query_lookups = getattr(cls, 'query_lookups', {})
+            if query_lookups:
+                QueryResponse = create_model(  # type: ignore[call-overload]
+                    QueryResponse.__name__,
+                    __base__=QueryResponse,
+                    **{
+                        name: (Optional[return_type(lookup)], None)
+                        for name, lookup in query_lookups.items()
+                    },
+                )
+
             examples = [
                 # If param "count" is False return the list of items
                 {
@@ -352,16 +787,28 @@ class RestApiBlueprint(APIRouter):
                 {
                     'summary': 'Count objects',
                     'description': 'Sending `true` value in `count` param',
-                    'value': {'count': 1},
+                    'value': {'count': 1, 'approximate': False},
                 },
             ]
 
             def validate_params(request: Request):
+                params = dict(request.query_params)
+                params.pop('fields', None)
+                if 'cursor' in params and not cursor_pagination:
+                    raise UnprocessableEntity(
+                        'cursor param is not supported by this resource'
+                    )
+                params.pop('cursor', None)
                 try:
-                    return cls.query_validator(**request.query_params)
+                    return cls.query_validator(**params)
                 except ValidationError as e:
                     raise UnprocessableEntity(e.json())
 
+            async def check_query_rate_limit(
+                query_params: Any = Depends(validate_params),
+            ) -> None:
+                await self.check_rate_limit(cls, 'query', query_params)
+
             @self.get(
                 path,
                 summary=f'{cls.__name__} - Query',
@@ -369,14 +816,22 @@ class RestApiBlueprint(APIRouter):
                 description=query_description,
                 responses=json_openapi(200, 'Successful Response', examples),
                 include_in_schema=include_in_schema,
+                dependencies=(
+                    [Depends(check_query_rate_limit)] if rate_limit else []
+                ),
             )
             @copy_attributes(cls)
             async def query(
+                request: Request,
                 query_params: cls.query_validator = Depends(  # type: ignore
                     validate_params
                 ),
+                fields: Optional[str] = Query(
+                    None, description=fields_description
+                ),
             ):
                 """GET /resource"""
+                projection = parse_fields(fields, projectable_fields)
                 if self.platform_id_filter_required() and hasattr(
                     cls.model, 'platform_id'
                 ):
@@ -392,55 +847,246 @@ class RestApiBlueprint(APIRouter):
                 filters = cls.get_query_filter(query_params)
                 if asyncio.iscoroutine(filters):
                     filters = await filters
+                cursor: Optional[Cursor] = None
+                if cursor_pagination and 'cursor' in request.query_params:
+                    cursor = decode_cursor(request.query_params['cursor'])
+                    query_params.limit = cursor.limit
                 if query_params.count:
-                    result = await _count(filters)
-                elif hasattr(cls, 'query'):
-                    result = await cls.query(
-                        await _all(query_params, filters, path)
+                    return await _count(filters)
+                if accepts_ndjson(request.headers.get('accept', '')):
+                    return StreamingResponse(
+                        _stream(query_params, filters, projection),
+                        media_type=NDJSON_MEDIA_TYPE,
                     )
-                else:
-                    result = await _all(query_params, filters, path)
+
+                # `_all` updates `query_params` to build the next page
+                lookups = [
+                    lookup(query_params.model_copy(), filters)
+                    for lookup in query_lookups.values()
+                ]
+                result, *values = await asyncio.gather(
+                    _all(
+                        query_params,
+                        filters,
+                        path,
+                        cursor,
+                        projection,
+                        dict(request.query_params),
+                        (
+                            request.state
+                            if should_explain(
+                                getattr(cls, 'explain_sample_rate', 0)
+                            )
+                            else None
+                        ),
+                    ),
+                    *lookups,
+                )
+                result.update(zip(query_lookups, values))
+                if hasattr(cls, 'query'):
+                    with timed('resource'):
+                        result = await cls.query(result)
+                if projection:
+                    result['items'] = serialize(result['items'], projection)
+                    return Response(content=jsonable_encoder(result))
                 return result
 
+            query.response_log_config_fields = get_sensitive_fields(
+                QueryResponse
+            )
+
             async def _count(filters: Q):
-                count = await cls.model.objects.filter(filters).async_count()
-                return dict(count=count)
+                if can_estimate_count(cls.model, filters):
+                    collection = cls.model._get_collection()
+                    with timed('db'):
+                        count = await create_awaitable(
+                            collection.estimated_document_count
+                        )
+                    return dict(count=count, approximate=True)
+                if count_cache:
+                    key = count_cache.key(cls.model, filters)
+                    cached = count_cache.get(key)
+                    if cached is not None:
+                        return dict(count=cached, approximate=True)
+                with timed('db'):
+                    count = await cls.model.objects.filter(
+                        filters
+                    ).async_count()
+                if count_cache:
+                    count_cache.set(key, count)
+                return dict(count=count, approximate=False)
+
+            async def _stream(
+                query: QueryParams,
+                filters: Q,
+                projection: Optional[list[str]] = None,
+            ) -> AsyncGenerator[str, None]:
+                """
+                Reads a single Mongo cursor in batches so memory stays flat
+                regardless of the number of matching items. pymongo is
+                blocking, each batch is read in the executor to keep the
+                event loop free. `limit` is honored but `page_size` and the
+                pagination `cursor` are not.
+                """
+                query_set = (
+                    cls.model.objects.order_by(*query_order)
+                    .filter(filters)
+                    .limit(query.limit or 0)
+                    .batch_size(STREAM_BATCH_SIZE)
+                    .no_cache()
+                )
+                if raw_documents:
+                    query_set = query_set.as_pymongo()
+                if projection and (only := only_fields(projection)):
+                    query_set = query_set.only(*only)
+
+                try:
+                    while batch := await create_awaitable(
+                        next_batch, query_set, STREAM_BATCH_SIZE
+                    ):
+                        items = [to_dict(i) for i in batch]
+                        if hasattr(cls, 'query'):
+                            response = await cls.query(
+                                dict(items=items, next_page_uri=None)
+                            )
+                            items = response['items']
+                        if projection:
+                            items = serialize(items, projection)
+                        elif response_model is not Any:
+                            items = [
+                                response_model.model_validate(item).model_dump(
+                                    mode='json', by_alias=True
+                                )
+                                for item in items
+                            ]
+                        yield ''.join(
+                            dumps(jsonable_encoder(item)) + '\n'
+                            for item in items
+                        )
+                except Exception as exc:
+                    # headers were already sent, the only way to tell the
+                    # client that the export is incomplete is in the body
+                    logger.exception('Error streaming %s', cls.__name__)
+                    yield dumps(dict(error=str(exc))) + '\n'
+                finally:
+                    query_set._cursor.close()
 
-            async def _all(query: QueryParams, filters: Q, resource_path: str):
+            async def _all(
+                query: QueryParams,
+                filters: Q,
+                resource_path: str,
+                cursor: Optional[Cursor] = None,
+                projection: Optional[list[str]] = None,
+                request_params: Optional[dict[str, str]] = None,
+                explain_state: Optional[Any] = None,
+            ):
                 if query.limit:
                     limit = min(query.limit, query.page_size)
                     query.limit = max(0, query.limit - limit)
                 else:
                     limit = query.page_size
+                if cursor:
+                    filters &= cursor_query(cursor)
+                wants_more = query.limit is None or query.limit > 0
+                # fetch one extra item to know if there is a next page
+                # within the same cursor instead of a second `count` query
                 query_set = (
-                    cls.model.objects.order_by("-created_at")
+                    cls.model.objects.order_by(*query_order)
                     .filter(filters)
-                    .limit(limit)
+                    .limit(limit + 1 if wants_more else limit)
                 )
-                items = await query_set.async_to_list()
-                item_dicts = [i.to_dict() for i in items]
-
-                has_more: Optional[bool] = None
-                if wants_more := query.limit is None or query.limit > 0:
-                    # only perform this query if it's necessary
-                    has_more = (
-                        await query_set.limit(limit + 1).async_count() > limit
-                    )
+                if projection and (only := only_fields(projection)):
+                    query_set = query_set.only(*only)
+                if raw_documents:
+                    query_set = query_set.as_pymongo()
+                if explain_state is not None:
+                    # LoggingRoute logs it together with the request, the
+                    # clone runs in its own cursor next to the page query
+                    with timed('db'):
+                        items, explain_state.explain = await asyncio.gather(
+                            query_set.async_to_list(),
+                            create_awaitable(explain_query, query_set.clone()),
+                        )
+                else:
+                    with timed('db'):
+                        items = await query_set.async_to_list()
+                has_more = len(items) > limit
+                items = items[:limit]
+                item_dicts = [to_dict(i) for i in items]
 
                 next_page_uri: Optional[str] = None
-                if wants_more and has_more:
+                if wants_more and has_more and cursor_pagination:
+                    # the cursor carries the position and the remaining
+                    # limit, the URI only keeps the params sent by the client
+                    params = {
+                        key: value
+                        for key, value in (request_params or {}).items()
+                        if key not in ('cursor', 'limit')
+                    }
+                    params['cursor'] = encode_cursor(
+                        sort_key(items[-1])._replace(limit=query.limit)
+                    )
+                    next_page_uri = f'{resource_path}?{urlencode(params)}'
+                elif wants_more and has_more:
                     query.created_before = item_dicts[-1]['created_at']
                     params = query.model_dump()
                     if self.user_id_filter_required():
                         params.pop('user_id')
                     if self.platform_id_filter_required():
                         params.pop('platform_id')
+                    if projection:
+                        params['fields'] = ','.join(projection)
                     next_page_uri = f'{resource_path}?{urlencode(params)}'
                 return dict(items=item_dicts, next_page_uri=next_page_uri)
 
             return cls
 
-        return wrapper_resource_class
+        return register_resource
+
+
+def return_type(func: Any) -> Any:
+    return get_type_hints(func).get('return', Any)
+
+
+def not_modified(etag: str) -> BaseResponse:
+    return BaseResponse(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}
+    )
+
+
+def next_batch(cursor: Iterator, size: int) -> list:
+    """
+    Reads up to `size` items from the same cursor. `islice` can not be used
+    because iterating a `QuerySetNoCache` again rewinds it.
+    """
+    batch = []
+    for _ in range(size):
+        try:
+            batch.append(next(cursor))
+        except StopIteration:
+            break
+    return batch
+
+
+def accepts_ndjson(accept: str) -> bool:
+    """
+    True when the `Accept` header lists NDJSON with a quality factor greater
+    than zero and not lower than `application/json`.
+    """
+    qualities: dict[str, float] = {}
+    for media_range in accept.split(','):
+        media_type, *params = media_range.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.strip().lower()] = quality
+    ndjson = qualities.get(NDJSON_MEDIA_TYPE, 0.0)
+    return ndjson > 0 and ndjson >= qualities.get('application/json', 0.0)
 
 
 def json_openapi(code: int, description, samples: list[dict]) -> dict:
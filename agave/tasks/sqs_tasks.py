@@ -2,21 +2,33 @@ import asyncio
 import json
 import logging
 import os
+from dataclasses import dataclass
 from functools import wraps
 from itertools import count
 from json import JSONDecodeError
-from typing import AsyncGenerator, Callable, Coroutine
+from typing import Any, AsyncGenerator, Callable, Coroutine, Optional
 
 from aiobotocore.httpsession import HTTPClientError
 from aiobotocore.session import get_session
 from pydantic import BaseModel, validate_call
 
 from ..core.exc import RetryTask
+from ..core.log_sink import log_sink
 from ..core.loggers import (
+    SAMPLED_OUT,
     get_request_model,
     get_response_model,
     get_sensitive_fields,
     obfuscate_sensitive_data,
+    sample_bodies,
+    truncate_body,
+)
+from ..core.tracing import (
+    TRACE_ID_ATTRIBUTE,
+    message_trace_id,
+    new_trace_id,
+    queue_wait_ms,
+    trace_id,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -28,41 +40,69 @@ AWS_DEFAULT_REGION = os.getenv('AWS_DEFAULT_REGION', '')
 BACKGROUND_TASKS = set()
 
 
+@dataclass(frozen=True)
+class TaskMetadata:
+    """What `run_task` needs from a task function, resolved once"""
+
+    func: Callable
+    name: str
+    module: str
+    request_log_config_fields: dict[str, Any]
+    response_log_config_fields: dict[str, Any]
+
+
+def get_task_metadata(task_func: Callable) -> TaskMetadata:
+    return TaskMetadata(
+        func=validate_call(task_func),
+        name=task_func.__name__,
+        module=task_func.__module__,
+        request_log_config_fields=get_sensitive_fields(
+            get_request_model(task_func)
+        ),
+        response_log_config_fields=get_sensitive_fields(
+            get_response_model(task_func)
+        ),
+    )
+
+
 async def run_task(
-    task_func: Callable,
+    task_metadata: TaskMetadata,
     body: dict,
     message: dict,
     sqs,
     queue_url: str,
     message_receive_count: int,
     max_retries: int,
+    log_sample_rate: float = 1.0,
+    log_max_body_size: Optional[int] = None,
 ) -> None:
     delete_message = True
-    request_model = get_request_model(task_func)
-    request_log_config_fields = get_sensitive_fields(request_model)
+    # messages sent outside of a request start their own trace, so the
+    # tasks they enqueue can be followed too
+    trace_token = trace_id.set(message_trace_id(message) or new_trace_id())
     ofuscated_request_body = obfuscate_sensitive_data(
         body,
-        request_log_config_fields,
+        task_metadata.request_log_config_fields,
     )
-    response_model = get_response_model(task_func)
-    response_log_config_fields = get_sensitive_fields(response_model)
-    log_data = {
+    log_data: dict[str, Any] = {
+        'trace_id': trace_id.get(),
         'request': {
-            'task_func': task_func.__name__,
-            'task_module': task_func.__module__,
+            'task_func': task_metadata.name,
+            'task_module': task_metadata.module,
             'queue_url': queue_url,
             'max_retries': max_retries,
             'body': ofuscated_request_body,
             'message_id': message['MessageId'],
             'message_attributes': message.get('Attributes', {}),
             'receipt_handle': message['ReceiptHandle'],
+            'queue_wait_ms': queue_wait_ms(message),
         },
         'response': {
             'status': 'success',
         },
     }
     try:
-        resp = await task_func(body)
+        resp = await task_metadata.func(body)
     except RetryTask as retry:
         delete_message = message_receive_count >= max_retries + 1
         if not delete_message and retry.countdown and retry.countdown > 0:
@@ -80,7 +120,7 @@ async def run_task(
         if isinstance(resp, BaseModel):
             ofuscated_response_body = obfuscate_sensitive_data(
                 resp.model_dump(),
-                response_log_config_fields,
+                task_metadata.response_log_config_fields,
             )
         else:
             ofuscated_response_body = resp
@@ -91,7 +131,38 @@ async def run_task(
                 QueueUrl=queue_url,
                 ReceiptHandle=message['ReceiptHandle'],
             )
-        logger.info(json.dumps(log_data, default=str))
+        limit_log_bodies(log_data, message, log_sample_rate, log_max_body_size)
+        log_sink.emit(logger, log_data)
+        trace_id.reset(trace_token)
+
+
+def limit_log_bodies(
+    log_data: dict,
+    message: dict,
+    sample_rate: float,
+    max_body_size: Optional[int],
+) -> None:
+    # failed and retried messages are always logged with their bodies
+    if log_data['response']['status'] == 'success' and not sample_bodies(
+        sample_rate
+    ):
+        log_data['request']['body'] = None
+        log_data['response']['body'] = None
+        log_data['skipped'] = {
+            'request.body': SAMPLED_OUT,
+            'response.body': SAMPLED_OUT,
+        }
+        return
+    skipped = {}
+    for part, size in (('request', len(message['Body'])), ('response', None)):
+        body, note = truncate_body(
+            log_data[part].get('body'), max_body_size, size
+        )
+        if note:
+            log_data[part]['body'] = body
+            skipped[f'{part}.body'] = note
+    if skipped:
+        log_data['skipped'] = skipped
 
 
 async def message_consumer(
@@ -108,7 +179,8 @@ async def message_consumer(
                 QueueUrl=queue_url,
                 WaitTimeSeconds=wait_time_seconds,
                 VisibilityTimeout=visibility_timeout,
-                AttributeNames=['ApproximateReceiveCount'],
+                AttributeNames=['ApproximateReceiveCount', 'SentTimestamp'],
+                MessageAttributeNames=[TRACE_ID_ATTRIBUTE],
             )
             messages = response['Messages']
         except KeyError:
@@ -135,8 +207,12 @@ def task(
     visibility_timeout: int = 3600,
     max_retries: int = 1,
     max_concurrent_tasks: int = 5,
+    log_sample_rate: float = 1.0,
+    log_max_body_size: Optional[int] = None,
 ):
     def task_builder(task_func: Callable):
+        task_metadata = get_task_metadata(task_func)
+
         @wraps(task_func)
         async def start_task(*args, **kwargs) -> None:
             can_read = asyncio.Event()
@@ -155,8 +231,6 @@ def task(
 
             session = get_session()
 
-            task_with_validators = validate_call(task_func)
-
             async with session.create_client('sqs', region_name) as sqs:
                 async for message in message_consumer(
                     queue_url,
@@ -176,13 +250,15 @@ def task(
                     bg_task = asyncio.create_task(
                         concurrency_controller(
                             run_task(
-                                task_with_validators,
+                                task_metadata,
                                 body,
                                 message,
                                 sqs,
                                 queue_url,
                                 message_receive_count,
                                 max_retries,
+                                log_sample_rate,
+                                log_max_body_size,
                             ),
                         ),
                         name='fast-agave-task',
@@ -1,5 +1,4 @@
 import asyncio
-import json
 from dataclasses import dataclass, field
 from typing import Optional, Union
 from uuid import uuid4
@@ -13,6 +12,9 @@ except ImportError:
         "You can install it with: pip install agave[asyncio_aws_tools]"
     )
 
+from ...core.encoders import dumps
+from ...core.tracing import trace_attributes
+
 
 @dataclass
 class SqsClient:
@@ -53,8 +55,9 @@ class SqsClient:
     ) -> None:
         await self._sqs.send_message(
             QueueUrl=self.queue_url,
-            MessageBody=data if type(data) is str else json.dumps(data),
+            MessageBody=data if type(data) is str else dumps(data),
             MessageGroupId=message_group_id or str(uuid4()),
+            MessageAttributes=trace_attributes(),
         )
 
     def send_message_async(
@@ -1,8 +1,9 @@
-import json
 from base64 import b64encode
 from typing import Iterable
 from uuid import uuid4
 
+from ..core.encoders import dumps
+
 
 def _b64_encode(value: str) -> str:
     encoded = b64encode(bytes(value, 'utf-8'))
@@ -32,7 +33,7 @@ def build_celery_message(
             group=None,
         ),
         body=_b64_encode(
-            json.dumps(
+            dumps(
                 (
                     args_,
                     kwargs_,
@@ -46,5 +47,5 @@ def build_celery_message(
     message['content-encoding'] = 'utf-8'
     message['content-type'] = 'application/json'
 
-    encoded = _b64_encode(json.dumps(message))
+    encoded = _b64_encode(dumps(message))
     return encoded
@@ -1,4 +1,3 @@
-import json
 from dataclasses import dataclass, field
 from typing import Optional, Union
 from uuid import uuid4
@@ -12,6 +11,9 @@ except ImportError:
         "You can install it with: pip install agave[sync_aws_tools]"
     )
 
+from ...core.encoders import dumps
+from ...core.tracing import trace_attributes
+
 
 @dataclass
 class SqsClient:
@@ -33,7 +35,8 @@ class SqsClient:
         sqs = self._get_client()
         sqs.send_message(
             QueueUrl=self.queue_url,
-            MessageBody=data if isinstance(data, str) else json.dumps(data),
+            MessageBody=data if isinstance(data, str) else dumps(data),
             MessageGroupId=message_group_id or str(uuid4()),
             MessageDeduplicationId=message_deduplication_id or str(uuid4()),
+            MessageAttributes=trace_attributes(),
         )
@@ -0,0 +1,124 @@
+"""
+Per-request overhead of `AgaveErrorHandler` as a `BaseHTTPMiddleware`, as
+it used to be, against the plain ASGI middleware. The apps are called
+directly through ASGI, without a server nor a client, so only the
+middleware and the routing are measured:
+
+    python -m benchmarks.error_handler
+"""
+
+import argparse
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.middleware.base import (
+    BaseHTTPMiddleware,
+    RequestResponseEndpoint,
+)
+from starlette.types import Message
+
+from agave.core.exc import AgaveError, NotFoundError
+from agave.fastapi.middlewares import AgaveErrorHandler
+from agave.fastapi.middlewares.error_handlers import (
+    error_response,
+    get_current_route_handler,
+)
+
+from .utils import measure, report
+
+CHUNKS = 100
+
+
+class BaseHTTPErrorHandler(BaseHTTPMiddleware):
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        try:
+            request.scope['route_handler'] = get_current_route_handler(request)
+            return await call_next(request)
+        except AgaveError as exc:
+            return error_response(exc)
+
+
+async def chunks() -> AsyncIterator[bytes]:
+    for _ in range(CHUNKS):
+        yield b'x' * 1024
+
+
+def build_app(middleware: type) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+
+    @app.get('/json')
+    async def json_route() -> dict:
+        return dict(id='AC01', name='Frida')
+
+    @app.get('/stream')
+    async def stream_route() -> StreamingResponse:
+        return StreamingResponse(chunks())
+
+    @app.get('/error')
+    async def error_route() -> JSONResponse:
+        raise NotFoundError('Not Found')
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> None:
+    scope = dict(
+        type='http',
+        asgi=dict(version='3.0', spec_version='2.4'),
+        http_version='1.1',
+        method='GET',
+        scheme='http',
+        path=path,
+        raw_path=path.encode(),
+        root_path='',
+        query_string=b'',
+        headers=[(b'host', b'bench')],
+        server=('bench', 80),
+        client=('bench', 1234),
+    )
+    request_sent = False
+
+    async def receive() -> Message:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return dict(type='http.request', body=b'', more_body=False)
+        # the client never disconnects
+        await asyncio.Event().wait()
+        return dict(type='http.disconnect')
+
+    async def send(_: Message) -> None:
+        return None
+
+    await app(scope, receive, send)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    apps = [
+        ('before', build_app(BaseHTTPErrorHandler)),
+        ('after', build_app(AgaveErrorHandler)),
+    ]
+    for path in ('/json', '/stream', '/error'):
+        for name, app in apps:
+            report(
+                f'{name} {path}',
+                measure(
+                    lambda: loop.run_until_complete(call(app, path)),
+                    args.iterations,
+                ),
+            )
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares the previous "page + count" strategy to detect if there is a next
+page against fetching `limit + 1` items in a single cursor. Both functions
+run the same Mongo operations as the previous and the current `_all` of the
+blueprints. It needs a real MongoDB server because the difference is one
+network round trip per page:
+
+    MONGO_URI=mongodb://localhost:27017/bench \
+        python -m benchmarks.query_pagination
+"""
+
+import argparse
+import datetime as dt
+
+from examples.models import Account
+
+from .utils import connect_db, measure, report
+
+
+def populate(total: int) -> None:
+    Account.objects.delete()
+    Account.objects.insert(
+        [
+            Account(
+                name=f'Account {i}',
+                user_id='US01',
+                platform_id='PT01',
+                api_key_id='AK01',
+                created_at=dt.datetime(2020, 1, 1) + dt.timedelta(seconds=i),
+            )
+            for i in range(total)
+        ],
+        load_bulk=False,
+    )
+
+
+def page_and_count(limit: int) -> None:
+    query_set = (
+        Account.objects.order_by('-created_at')
+        .filter(platform_id='PT01')
+        .limit(limit)
+    )
+    [item.to_dict() for item in query_set]
+    # `count()` ignores the limit, so this counted every matching document
+    query_set.limit(limit + 1).count() > limit
+
+
+def single_cursor(limit: int) -> None:
+    items = list(
+        Account.objects.order_by('-created_at')
+        .filter(platform_id='PT01')
+        .limit(limit + 1)
+    )
+    len(items) > limit
+    [item.to_dict() for item in items[:limit]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=5_000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    connect_db(require_server=True)
+    populate(args.documents)
+    for name, func in [
+        ('page + count', page_and_count),
+        ('single cursor', single_cursor),
+    ]:
+        report(name, measure(lambda: func(args.page_size), args.iterations))
+    Account.objects.delete()
+
+
+if __name__ == '__main__':
+    main()
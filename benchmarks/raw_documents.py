@@ -0,0 +1,82 @@
+"""
+Compares building mongoengine documents and calling `to_dict()` against
+converting raw documents (`as_pymongo()`) with `raw_converter`, the two
+paths of the blueprints depending on `raw_documents`. The difference is
+CPU work so the in-memory database is enough, set `MONGO_URI` to include
+the decoding cost of a real server:
+
+    python -m benchmarks.raw_documents
+"""
+
+import argparse
+import datetime as dt
+
+from agave.core.raw_documents import raw_converter
+from examples.models import Account
+
+from .utils import connect_db, measure, report
+
+
+def populate(total: int) -> None:
+    Account.objects.delete()
+    Account.objects.insert(
+        [
+            Account(
+                name=f'Account {i}',
+                user_id='US01',
+                platform_id='PT01',
+                api_key_id='AK01',
+                created_at=dt.datetime(2020, 1, 1) + dt.timedelta(seconds=i),
+            )
+            for i in range(total)
+        ],
+        load_bulk=False,
+    )
+
+
+def page_query(page_size: int):
+    return (
+        Account.objects.order_by('-created_at')
+        .filter(platform_id='PT01')
+        .limit(page_size)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    connect_db()
+    populate(args.page_size)
+    convert = raw_converter(Account)
+    raw_page = list(page_query(args.page_size).as_pymongo())
+    assert [convert(raw) for raw in raw_page] == [
+        item.to_dict() for item in page_query(args.page_size)
+    ]
+
+    cases = [
+        (
+            'documents (convert)',
+            lambda: [Account._from_son(raw).to_dict() for raw in raw_page],
+        ),
+        ('raw (convert)', lambda: [convert(raw) for raw in raw_page]),
+        (
+            'documents (query)',
+            lambda: [item.to_dict() for item in page_query(args.page_size)],
+        ),
+        (
+            'raw (query)',
+            lambda: [
+                convert(raw) for raw in page_query(args.page_size).as_pymongo()
+            ],
+        ),
+    ]
+    for name, func in cases:
+        report(name, measure(func, args.iterations))
+    Account.objects.delete()
+
+
+if __name__ == '__main__':
+    main()
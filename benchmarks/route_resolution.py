@@ -0,0 +1,72 @@
+"""
+Time `AgaveErrorHandler` takes to find the route of a request in an app
+with a few hundred routes: scanning every route, as it used to, against
+the `RouteIndex`:
+
+    python -m benchmarks.route_resolution --resources 60
+"""
+
+import argparse
+
+from fastapi import FastAPI
+from starlette.routing import Match
+
+from agave.core.exc import AgaveError
+from agave.fastapi.middlewares.error_handlers import RouteIndex
+
+from .utils import measure, report
+
+
+def build_app(resources: int) -> FastAPI:
+    app = FastAPI()
+    for number in range(resources):
+
+        async def endpoint() -> dict:
+            return dict()
+
+        path = f'/resource_{number}'
+        app.get(path)(endpoint)
+        app.post(path)(endpoint)
+        app.get(path + '/{id}')(endpoint)
+        app.patch(path + '/{id}')(endpoint)
+        app.delete(path + '/{id}')(endpoint)
+    return app
+
+
+def linear_scan(app: FastAPI, scope: dict) -> None:
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resources', type=int, default=60)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = build_app(args.resources)
+    index = RouteIndex(app.routes)
+
+    def resolve(scope: dict) -> None:
+        try:
+            index.resolve(scope)
+        except AgaveError:
+            pass
+
+    last = args.resources - 1
+    paths = [('last', f'/resource_{last}/AC01'), ('404', '/unknown/AC01')]
+    print(f'{len(app.routes)} routes')
+    for name, path in paths:
+        scope = dict(type='http', method='PATCH', path=path, root_path='')
+        cases = [
+            (f'scan {name}', lambda: linear_scan(app, scope)),
+            (f'index {name}', lambda: resolve(scope)),
+        ]
+        for case, func in cases:
+            report(case, measure(func, args.iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Per-message overhead of `run_task` when the models and sensitive fields
+of the task are resolved for every message, as it used to be, against
+resolving them once in `task_builder`. SQS and the log sink are left
+out, only the work around the task itself is measured:
+
+    python -m benchmarks.task_overhead
+"""
+
+import argparse
+import asyncio
+import logging
+from dataclasses import replace
+from typing import Annotated, Optional
+
+from cuenca_validations.types import LogConfig
+from pydantic import BaseModel
+
+from agave.core.loggers import (
+    get_request_model,
+    get_response_model,
+    get_sensitive_fields,
+)
+from agave.tasks.sqs_tasks import get_task_metadata, run_task
+
+from .utils import measure, report
+
+
+class Card(BaseModel):
+    number: Annotated[str, LogConfig(masked=True, unmasked_chars_length=4)]
+
+
+class Request(BaseModel):
+    id: str
+    amount: int
+    card: Card
+    secret: Annotated[str, LogConfig(excluded=True)]
+
+
+class Response(BaseModel):
+    id: str
+    api_key: Annotated[str, LogConfig(masked=True)]
+    card: Optional[Card] = None
+
+
+async def my_task(data: Request) -> Response:
+    return Response(id=data.id, api_key='secret', card=data.card)
+
+
+class FakeSQS:
+    async def delete_message(self, **_) -> None:
+        return None
+
+
+BODY = dict(
+    id='TR01', amount=100, card=dict(number='4111111111111111'), secret='s'
+)
+MESSAGE = dict(MessageId='1', ReceiptHandle='handle', Body='{}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    # `emit` skips disabled loggers, the encoding is not measured
+    logging.getLogger('agave.tasks.sqs_tasks').setLevel(logging.WARNING)
+    loop = asyncio.new_event_loop()
+    sqs = FakeSQS()
+    metadata = get_task_metadata(my_task)
+
+    def message(resolve_metadata: bool) -> None:
+        task_metadata = metadata
+        if resolve_metadata:
+            task_metadata = replace(
+                metadata,
+                request_log_config_fields=get_sensitive_fields(
+                    get_request_model(my_task)
+                ),
+                response_log_config_fields=get_sensitive_fields(
+                    get_response_model(my_task)
+                ),
+            )
+        loop.run_until_complete(
+            run_task(task_metadata, BODY, MESSAGE, sqs, 'queue', 1, 1)
+        )
+
+    cases = [
+        ('per message (before)', lambda: message(True)),
+        ('once per task (after)', lambda: message(False)),
+    ]
+    for name, func in cases:
+        report(name, measure(func, args.iterations))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
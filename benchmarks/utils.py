@@ -0,0 +1,48 @@
+import os
+import statistics
+import time
+from typing import Callable
+
+import mongomock
+from mongoengine import connect
+
+MONGO_URI = os.getenv('MONGO_URI', '')
+
+
+def connect_db(require_server: bool = False) -> None:
+    """
+    Connects to `MONGO_URI` when it is defined. Otherwise an in-memory
+    mongomock database is used, which is fine to compare CPU work but
+    hides the network round trips a real deployment pays for, so
+    benchmarks about round trips must pass `require_server=True`.
+    """
+    if MONGO_URI:
+        connect(host=MONGO_URI)
+    elif require_server:
+        raise SystemExit(
+            'This benchmark measures Mongo round trips, '
+            'set MONGO_URI to a real MongoDB server'
+        )
+    else:
+        connect(
+            host='mongodb://localhost:27017/benchmarks',
+            mongo_client_class=mongomock.MongoClient,
+        )
+
+
+def measure(func: Callable[[], object], iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name: str, samples: list[float]) -> None:
+    percentiles = statistics.quantiles(samples, n=100)
+    print(
+        f'{name:<24} p50={percentiles[49]:8.3f}ms '
+        f'p99={percentiles[98]:8.3f}ms '
+        f'mean={statistics.fmean(samples):8.3f}ms'
+    )
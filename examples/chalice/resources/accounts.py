@@ -15,6 +15,8 @@ class Account:
     query_validator = AccountQuery
     update_validator = AccountUpdateRequest
     get_query_filter = generic_query
+    count_cache_ttl = 60
+    raw_documents = True
 
     @staticmethod
     @app.validate(AccountRequest)
@@ -10,3 +10,4 @@ class User:
     model = UserModel
     query_validator = UserQuery
     get_query_filter = generic_query
+    etag_field = 'updated_at'
@@ -1,19 +1,17 @@
 from typing import Any
 
-from starlette_context import context
-
 from agave.fastapi import RestApiBlueprint
 
 
 class CustomQueryBlueprint(RestApiBlueprint):
     @property
     def custom(self) -> str:
-        return context['custom']
+        return self.context.extra['custom']
 
     def property_filter_required(self) -> bool:
-        return context.get('custom_filter_required')
+        return self.context.extra.get('custom_filter_required', False)
 
-    def custom_filter_required(self, query_params: Any, model: any) -> None:
+    def custom_filter_required(self, query_params: Any, model: Any) -> None:
         if self.property_filter_required() and hasattr(model, 'custom'):
             query_params.custom = self.custom
 
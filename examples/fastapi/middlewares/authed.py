@@ -1,8 +1,7 @@
-from fastapi import Request
-from starlette.middleware.base import RequestResponseEndpoint
-from starlette.responses import Response
-from starlette_context import _request_scope_context_storage
-from starlette_context.middleware import ContextMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from agave.fastapi import RequestContext
+from agave.fastapi.context import use_request_context
 
 from ...config import (
     TEST_DEFAULT_API_KEY_ID,
@@ -11,17 +10,9 @@ from ...config import (
 )
 
 
-class AuthedMiddleware(ContextMiddleware):
-    def __init__(
-        self, app, plugins=None, default_error_response=None, *args, **kwargs
-    ):
-        super().__init__(
-            app=app,
-            plugins=plugins,
-            default_error_response=default_error_response,
-            *args,
-            **kwargs,
-        )
+class AuthedMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
     def required_user_id(self) -> bool:
         """
@@ -37,33 +28,25 @@ class AuthedMiddleware(ContextMiddleware):
         """
         return False
 
-    async def authenticate(self):
-        self.token = _request_scope_context_storage.set(
-            dict(
-                user_id=TEST_DEFAULT_USER_ID,
-                platform_id=TEST_DEFAULT_PLATFORM_ID,
-                api_key_id=TEST_DEFAULT_API_KEY_ID,
-            )
+    async def authenticate(self) -> RequestContext:
+        return RequestContext(
+            user_id=TEST_DEFAULT_USER_ID,
+            platform_id=TEST_DEFAULT_PLATFORM_ID,
+            api_key_id=TEST_DEFAULT_API_KEY_ID,
         )
 
-    async def authorize(self):
-        context = _request_scope_context_storage.get()
-        context['user_id_filter_required'] = self.required_user_id()
-        context['platform_id_filter_required'] = self.required_platform_id()
-        self.token = _request_scope_context_storage.set(context)
-
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        try:
-            # Authentication and authorization goes here!
-            await self.authenticate()
-            await self.authorize()
-            response = await call_next(request)
-            for plugin in self.plugins:
-                await plugin.enrich_response(response)
-
-        finally:
-            _request_scope_context_storage.reset(self.token)
-
-        return response
+    async def authorize(self, context: RequestContext) -> None:
+        context.user_id_filter_required = self.required_user_id()
+        context.platform_id_filter_required = self.required_platform_id()
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        # Authentication and authorization goes here!
+        context = await self.authenticate()
+        await self.authorize(context)
+        with use_request_context(context):
+            await self.app(scope, receive, send)
@@ -1,9 +1,9 @@
 import datetime as dt
 
 from fastapi import Request
-from fastapi.responses import JSONResponse as Response
 
 from agave.core.filters import generic_query
+from agave.fastapi.responses import AgaveJSONResponse as Response
 
 from ...models import Account as AccountModel
 from ...validators import (
@@ -21,6 +21,8 @@ class Account:
     query_validator = AccountQuery
     update_validator = AccountUpdateRequest
     get_query_filter = generic_query
+    count_cache_ttl = 60
+    raw_documents = True
     response_model = AccountResponse
 
     @staticmethod
@@ -1,9 +1,9 @@
 import datetime as dt
 
 from fastapi import Request
-from fastapi.responses import JSONResponse as Response
 
 from agave.core.filters import generic_query
+from agave.fastapi.responses import AgaveJSONResponse as Response
 
 from ...models import ApiKey as ApiKeyModel
 from ...validators import ApiKeyRequest, ApiKeyResponse
@@ -1,17 +1,32 @@
-from fastapi.responses import JSONResponse as Response
+from mongoengine import Q
 
 from agave.core.filters import generic_query
+from agave.core.rate_limit import RateLimiter
+from agave.fastapi.responses import AgaveJSONResponse as Response
 
 from ...models import Card as CardModel
 from ...validators import CardQuery
 from .base import app
 
 
+async def total_cards(_: CardQuery, filters: Q) -> int:
+    return await CardModel.objects.filter(filters).async_count()
+
+
 @app.resource('/cards')
 class Card:
     model = CardModel
     query_validator = CardQuery
     get_query_filter = generic_query
+    cursor_pagination = True
+    raw_documents = True
+    query_lookups = dict(total=total_cards)
+    log_sample_rate = dict(query=0.1)
+    log_max_body_size = 10_000
+    # counts and big pages take more tokens
+    rate_limit = RateLimiter(
+        rate=100, burst=1000, costs=dict(count=10, item=0.01)
+    )
 
     @staticmethod
     async def retrieve(card: CardModel) -> Response:
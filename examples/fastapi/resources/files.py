@@ -1,9 +1,9 @@
 from io import BytesIO
 
 from fastapi import BackgroundTasks
-from fastapi.responses import JSONResponse as Response
 
 from agave.core.filters import generic_query
+from agave.fastapi.responses import AgaveJSONResponse as Response
 
 from ...models import File as FileModel
 from ...validators import FileQuery, FileUploadValidator
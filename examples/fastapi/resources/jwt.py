@@ -1,5 +1,6 @@
 from fastapi.requests import Request
-from fastapi.responses import JSONResponse as Response
+
+from agave.fastapi.responses import AgaveJSONResponse as Response
 
 from ...models import Jwt as JwtModel
 from .base import app
@@ -1,4 +1,4 @@
-from fastapi.responses import JSONResponse as Response
+from agave.fastapi.responses import AgaveJSONResponse as Response
 
 from ...models.transactions import Transaction as TransactionModel
 from .base import app
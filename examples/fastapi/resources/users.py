@@ -1,7 +1,7 @@
 from fastapi import Request
-from fastapi.responses import JSONResponse as Response
 
 from agave.core.filters import generic_query
+from agave.fastapi.responses import AgaveJSONResponse as Response
 
 from ...models import User as UserModel
 from ...validators import UserQuery, UserUpdateRequest
@@ -13,6 +13,7 @@ class User:
     model = UserModel
     query_validator = UserQuery
     get_query_filter = generic_query
+    etag_field = 'updated_at'
     update_validator = UserUpdateRequest
 
     @staticmethod
@@ -9,3 +9,11 @@ class Card(BaseModel, AsyncDocument):
     number = StringField(required=True)
     user_id = StringField(required=True)
     created_at = DateTimeField()
+
+    meta = dict(
+        indexes=[
+            # required by `cursor_pagination`, with and without `user_id`
+            ('-created_at', '-id'),
+            ('user_id', '-created_at', '-id'),
+        ]
+    )
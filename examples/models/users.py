@@ -4,11 +4,14 @@ from cuenca_validations.types import uuid_field
 from mongoengine import DateTimeField, StringField
 from mongoengine_plus.aio import AsyncDocument
 from mongoengine_plus.models import BaseModel
+from mongoengine_plus.models.event_handlers import updated_at
 
 
+@updated_at.apply
 class User(BaseModel, AsyncDocument):
     id = StringField(primary_key=True, default=uuid_field('US'))
     created_at = DateTimeField(default=dt.datetime.utcnow)
+    updated_at = DateTimeField()
     name = StringField(required=True)
     platform_id = StringField(required=True)
     ip = StringField()
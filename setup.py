@@ -47,6 +47,9 @@ setup(
             'boto3>=1.34.106,<2.0.0',
             'types-boto3[sqs]>=1.34.106,<2.0.0',
         ],
+        'orjson': [
+            'orjson>=3.8.0,<4.0.0',
+        ],
         'asyncio_aws_tools': [
             'aiobotocore>=2.0.0,<3.0.0',
             'types-aiobotocore-sqs>=2.1.0,<3.0.0',
@@ -1,21 +1,36 @@
+import asyncio
 import datetime as dt
+import json
+import logging
 from tempfile import TemporaryFile
-from unittest.mock import MagicMock, patch
-from urllib.parse import urlencode
+from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import parse_qs, urlencode, urlparse
 
 import pytest
 from fastapi.testclient import TestClient
+from mongoengine_plus.aio.async_query_set import AsyncQuerySet
 
 from agave.core.filters import generic_query
+from agave.core.rate_limit import RateLimiter
+from agave.fastapi import RestApiBlueprint
+from agave.fastapi.rest_api import accepts_ndjson
+from examples.chalice.resources.accounts import (
+    Account as ChaliceAccountResource,
+)
 from examples.config import (
     TEST_DEFAULT_API_KEY_ID,
     TEST_DEFAULT_PLATFORM_ID,
     TEST_DEFAULT_USER_ID,
     TEST_SECOND_PLATFORM_ID,
 )
+from examples.fastapi.resources.accounts import Account as AccountResource
 from examples.fastapi.resources.billers import Biller as BillerResource
+from examples.fastapi.resources.cards import Card as CardResource
 from examples.models import Account, Card, File, User
 
+from ..core.test_indexes import EXPLAIN
+from ..utils import extract_log_data, timeout
+
 # Constants for both frameworks
 FRAMEWORK_CONFIGS = {
     'chalice': {
@@ -173,6 +188,173 @@ def test_retrieve_resource_not_found(
     assert resp.status_code == 404
 
 
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+def test_batch_retrieve(
+    client_fixture: str,
+    request: pytest.FixtureRequest,
+    accounts: list[Account],
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    ids = [accounts[2].id, 'AC_UNKNOWN', accounts[0].id, accounts[2].id]
+    resp = client.get(f'/accounts/batch?ids={",".join(ids)}')
+    assert resp.status_code == 200
+    assert resp.json() == dict(
+        items=[accounts[2].to_dict(), accounts[0].to_dict()],
+        missing_ids=['AC_UNKNOWN'],
+    )
+
+
+@pytest.mark.parametrize(
+    "client_fixture, framework_config",
+    [
+        ("fastapi_client", FRAMEWORK_CONFIGS["fastapi"]),
+        ("chalice_client", FRAMEWORK_CONFIGS["chalice"]),
+    ],
+)
+def test_batch_retrieve_user_id_filter_required(
+    client_fixture: str,
+    framework_config: dict,
+    request: pytest.FixtureRequest,
+    account: Account,
+    other_account: Account,
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    with patch(
+        framework_config['user_id_filter'], MagicMock(return_value=True)
+    ):
+        resp = client.get(
+            f'/accounts/batch?ids={account.id},{other_account.id}'
+        )
+    assert resp.status_code == 200
+    assert resp.json() == dict(
+        items=[account.to_dict()], missing_ids=[other_account.id]
+    )
+
+
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+def test_batch_retrieve_me(
+    client_fixture: str, request: pytest.FixtureRequest
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    user = User(
+        id=TEST_DEFAULT_USER_ID,
+        name='Me',
+        platform_id=TEST_DEFAULT_PLATFORM_ID,
+    )
+    user.save()
+    resp = client.get('/users/batch?ids=me,US_UNKNOWN')
+    user.delete()
+    assert resp.status_code == 200
+    json_body = resp.json()
+    assert [item['id'] for item in json_body['items']] == [user.id]
+    assert json_body['missing_ids'] == ['US_UNKNOWN']
+
+
+@pytest.mark.parametrize(
+    "client_fixture, framework_config",
+    [
+        ("fastapi_client", FRAMEWORK_CONFIGS["fastapi"]),
+        ("chalice_client", FRAMEWORK_CONFIGS["chalice"]),
+    ],
+)
+@pytest.mark.parametrize(
+    'query', ['', '?ids=', f'?ids={",".join(map(str, range(101)))}']
+)
+def test_batch_retrieve_invalid_ids(
+    client_fixture: str,
+    framework_config: dict,
+    request: pytest.FixtureRequest,
+    query: str,
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    resp = client.get(f'/accounts/batch{query}')
+    assert resp.status_code == framework_config['validation_error_code']
+
+
+def test_batch_retrieve_not_created_for_custom_retrieve(
+    fastapi_client: TestClient, card: Card
+) -> None:
+    resp = fastapi_client.get(f'/cards/batch?ids={card.id}')
+    assert resp.status_code == 404
+
+
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+def test_retrieve_etag_from_content(
+    client_fixture: str, request: pytest.FixtureRequest, account: Account
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    resp = client.get(f'/accounts/{account.id}')
+    assert resp.status_code == 200
+    etag = resp.headers['ETag']
+
+    for if_none_match in [etag, f'W/{etag}', f'"other", {etag}', '*']:
+        resp = client.get(
+            f'/accounts/{account.id}', headers={'If-None-Match': if_none_match}
+        )
+        assert resp.status_code == 304
+        assert resp.headers['ETag'] == etag
+
+    account.name = 'Leonora Carrington'
+    account.save()
+    resp = client.get(
+        f'/accounts/{account.id}', headers={'If-None-Match': etag}
+    )
+    assert resp.status_code == 200
+    assert resp.json()['name'] == 'Leonora Carrington'
+    assert resp.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+def test_retrieve_etag_from_version(
+    client_fixture: str, request: pytest.FixtureRequest, user: User
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    resp = client.get(f'/users/{user.id}')
+    assert resp.status_code == 200
+    etag = resp.headers['ETag']
+
+    with patch.object(User, 'to_dict', side_effect=AssertionError):
+        resp = client.get(f'/users/{user.id}', headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert resp.headers['ETag'] == etag
+
+    user.name = 'Pedrito Sola'
+    user.save()
+    resp = client.get(f'/users/{user.id}', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.json()['name'] == 'Pedrito Sola'
+    assert resp.headers['ETag'] != etag
+
+
+def test_retrieve_etag_depends_on_fields(
+    fastapi_client: TestClient, user: User
+) -> None:
+    resp = fastapi_client.get(f'/users/{user.id}?fields=name')
+    assert resp.json() == dict(id=user.id, name=user.name)
+    etag = resp.headers['ETag']
+    assert fastapi_client.get(f'/users/{user.id}').headers['ETag'] != etag
+    resp = fastapi_client.get(
+        f'/users/{user.id}?fields=name', headers={'If-None-Match': etag}
+    )
+    assert resp.status_code == 304
+
+
+def test_retrieve_custom_method_without_etag(
+    fastapi_client: TestClient, card: Card
+) -> None:
+    resp = fastapi_client.get(f'/cards/{card.id}')
+    assert resp.status_code == 200
+    assert 'etag' not in resp.headers
+
+
 @pytest.mark.parametrize(
     "client_fixture, framework_config",
     [
@@ -280,6 +462,69 @@ def test_query_count_resource(
     status_code = resp.status_code
     assert status_code == 200
     assert json_body['count'] == 1
+    assert json_body['approximate'] is False
+
+
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+def test_query_count_without_filters_is_estimated(
+    client_fixture: str,
+    request: pytest.FixtureRequest,
+    accounts: list[Account],
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    resp = client.get('/accounts?count=1')
+    assert resp.status_code == 200
+    assert resp.json()['count'] == len(accounts)
+    assert resp.json()['approximate'] is True
+
+
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+@pytest.mark.usefixtures('accounts')
+def test_query_count_cached_until_write(
+    client_fixture: str, request: pytest.FixtureRequest
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    count_uri = f'/accounts?{urlencode(dict(count=1, name="Frida Kahlo"))}'
+    assert client.get(count_uri).json()['count'] == 1
+
+    Account(
+        name='Frida Kahlo',
+        user_id=TEST_DEFAULT_USER_ID,
+        platform_id=TEST_DEFAULT_PLATFORM_ID,
+        api_key_id=TEST_DEFAULT_API_KEY_ID,
+    ).save()
+    json_body = client.get(count_uri).json()
+    assert json_body['count'] == 1
+    assert json_body['approximate'] is True
+
+    resp = client.post('/accounts', json=dict(name='Frida Kahlo'))
+    assert resp.status_code == 201
+    json_body = client.get(count_uri).json()
+    assert json_body['count'] == 3
+    assert json_body['approximate'] is False
+
+
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+def test_raw_documents_skip_to_dict(
+    client_fixture: str,
+    request: pytest.FixtureRequest,
+    accounts: list[Account],
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    expected = [a.to_dict() for a in reversed(accounts)]
+    with patch.object(Account, 'to_dict', side_effect=AssertionError):
+        resp = client.get(f'/accounts/{expected[0]["id"]}')
+        assert resp.status_code == 200
+        assert resp.json() == expected[0]
+        resp = client.get('/accounts')
+        assert resp.status_code == 200
+        assert resp.json()['items'] == expected
 
 
 @pytest.mark.parametrize(
@@ -665,3 +910,342 @@ def test_upload_resource_with_invalid_form(fastapi_client: TestClient) -> None:
     wrong_form = dict(another_file=b'Whasaaaaap')
     resp = fastapi_client.post('/files', files=wrong_form)
     assert resp.status_code == 400
+
+
+def test_query_cursor_pagination_with_same_created_at(
+    fastapi_client: TestClient,
+) -> None:
+    created_at = dt.datetime(2020, 1, 1)
+    cards = [
+        Card(
+            number=f'543400000000000{i}',
+            user_id=TEST_DEFAULT_USER_ID,
+            created_at=created_at,
+        )
+        for i in range(5)
+    ]
+    for card in cards:
+        card.save()
+
+    items = []
+    page_uri = f'/cards?{urlencode(dict(page_size=2))}'
+    while page_uri:
+        resp = fastapi_client.get(page_uri)
+        assert resp.status_code == 200
+        json_body = resp.json()
+        items.extend(json_body['items'])
+        page_uri = json_body['next_page_uri']
+        assert page_uri is None or 'cursor=' in page_uri
+    Card.objects.delete()
+
+    assert [item['id'] for item in items] == sorted(
+        (card.id for card in cards), reverse=True
+    )
+
+
+@pytest.mark.usefixtures('cards')
+def test_query_cursor_pagination_next_page_uri(
+    fastapi_client: TestClient,
+) -> None:
+    items = []
+    page_uri = f'/cards?{urlencode(dict(page_size=2, limit=3))}'
+    while page_uri:
+        resp = fastapi_client.get(page_uri)
+        assert resp.status_code == 200
+        json_body = resp.json()
+        items.extend(json_body['items'])
+        page_uri = json_body['next_page_uri']
+        if page_uri:
+            params = set(parse_qs(urlparse(page_uri).query))
+            assert params == {'page_size', 'cursor'}
+    assert len(items) == 3
+
+
+@pytest.mark.usefixtures('accounts')
+def test_query_cursor_not_supported(fastapi_client: TestClient) -> None:
+    resp = fastapi_client.get('/accounts?cursor=abc')
+    assert resp.status_code == 422
+    assert resp.json() == dict(
+        error='cursor param is not supported by this resource'
+    )
+
+
+def test_query_cursor_pagination_invalid_cursor(
+    fastapi_client: TestClient,
+) -> None:
+    resp = fastapi_client.get('/cards?cursor=not-a-cursor')
+    assert resp.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "client_fixture", ["fastapi_client", "chalice_client"]
+)
+@pytest.mark.usefixtures('accounts')
+def test_query_next_page_without_count(
+    client_fixture: str, request: pytest.FixtureRequest
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    with patch('mongoengine.queryset.queryset.QuerySet.count') as count:
+        resp = client.get(f'/accounts?{urlencode(dict(page_size=2))}')
+    assert resp.status_code == 200
+    assert len(resp.json()['items']) == 2
+    assert resp.json()['next_page_uri'] is not None
+    count.assert_not_called()
+
+
+def test_retrieve_resource_with_fields(
+    fastapi_client: TestClient, account: Account
+) -> None:
+    resp = fastapi_client.get(f'/accounts/{account.id}?fields=name,user_id')
+    assert resp.status_code == 200
+    assert resp.json() == dict(
+        id=account.id, name=account.name, user_id=account.user_id
+    )
+
+
+def test_retrieve_resource_with_invalid_fields(
+    fastapi_client: TestClient, account: Account
+) -> None:
+    resp = fastapi_client.get(f'/accounts/{account.id}?fields=name,unknown')
+    assert resp.status_code == 422
+
+
+def test_retrieve_custom_method_ignores_fields(
+    fastapi_client: TestClient, card: Card
+) -> None:
+    resp = fastapi_client.get(f'/cards/{card.id}?fields=number')
+    assert resp.status_code == 200
+    assert resp.json()['number'] == '*' * 16
+    assert 'created_at' in resp.json()
+    parameters = fastapi_client.get('/openapi.json').json()['paths'][
+        '/cards/{id}'
+    ]['get']['parameters']
+    assert [param['name'] for param in parameters] == ['id']
+
+
+@pytest.mark.usefixtures('accounts')
+def test_query_resource_with_fields(fastapi_client: TestClient) -> None:
+    items = []
+    page_uri = f'/accounts?{urlencode(dict(page_size=2, fields="name"))}'
+    while page_uri:
+        resp = fastapi_client.get(page_uri)
+        assert resp.status_code == 200
+        json_body = resp.json()
+        items.extend(json_body['items'])
+        page_uri = json_body['next_page_uri']
+        if page_uri:
+            assert parse_qs(urlparse(page_uri).query)['fields'] == ['name']
+    assert len(items) == 6
+    assert all(set(item) == {'id', 'name'} for item in items)
+
+
+@pytest.mark.usefixtures('cards')
+def test_query_custom_method_with_fields(fastapi_client: TestClient) -> None:
+    resp = fastapi_client.get('/cards?fields=number')
+    assert resp.status_code == 200
+    items = resp.json()['items']
+    assert len(items) == 4
+    assert all(item['number'] == '*' * 16 for item in items)
+    assert all(set(item) == {'id', 'number'} for item in items)
+
+
+def test_query_stream_ndjson(
+    fastapi_client: TestClient, accounts: list[Account]
+) -> None:
+    with timeout(15):
+        resp = fastapi_client.get(
+            '/accounts?page_size=2',
+            headers={'Accept': 'application/x-ndjson, */*;q=0.1'},
+        )
+    assert resp.status_code == 200
+    assert resp.headers['content-type'] == 'application/x-ndjson'
+    items = [json.loads(line) for line in resp.text.splitlines()]
+    assert items == [a.to_dict() for a in reversed(accounts)]
+
+
+def test_query_stream_ndjson_user_id_filter_required(
+    fastapi_client: TestClient, accounts: list[Account]
+) -> None:
+    with (
+        patch(
+            'examples.fastapi.middlewares.AuthedMiddleware.required_user_id',
+            MagicMock(return_value=True),
+        ),
+        timeout(15),
+    ):
+        resp = fastapi_client.get(
+            '/accounts?limit=2&fields=user_id',
+            headers={'Accept': 'application/x-ndjson'},
+        )
+    assert resp.status_code == 200
+    items = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(items) == 2
+    assert all(set(item) == {'id', 'user_id'} for item in items)
+    assert all(item['user_id'] == TEST_DEFAULT_USER_ID for item in items)
+
+
+@pytest.mark.usefixtures('cards')
+def test_query_stream_ndjson_custom_method(
+    fastapi_client: TestClient,
+) -> None:
+    with timeout(15):
+        resp = fastapi_client.get(
+            '/cards', headers={'Accept': 'application/x-ndjson'}
+        )
+    assert resp.status_code == 200
+    items = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(items) == 4
+    assert all(item['number'] == '*' * 16 for item in items)
+
+
+@pytest.mark.usefixtures('cards')
+def test_query_stream_ndjson_error(
+    fastapi_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        CardResource, 'query', AsyncMock(side_effect=ValueError('boom'))
+    )
+    with timeout(15):
+        resp = fastapi_client.get(
+            '/cards', headers={'Accept': 'application/x-ndjson'}
+        )
+    assert resp.status_code == 200
+    assert [json.loads(line) for line in resp.text.splitlines()] == [
+        dict(error='boom')
+    ]
+
+
+@pytest.mark.parametrize(
+    'accept, expected',
+    [
+        ('application/x-ndjson', True),
+        ('application/x-ndjson, */*;q=0.1', True),
+        ('application/json;q=0.5, application/x-ndjson;q=0.9', True),
+        ('application/json, application/x-ndjson;q=0.5', False),
+        ('application/x-ndjson;q=0', False),
+        ('application/x-ndjson;q=x', False),
+        ('application/json', False),
+        ('', False),
+    ],
+)
+def test_accepts_ndjson(accept: str, expected: bool) -> None:
+    assert accepts_ndjson(accept) is expected
+
+
+@pytest.mark.usefixtures('accounts')
+def test_chalice_query_explain(chalice_client, caplog) -> None:
+    caplog.set_level(logging.INFO)
+    with (
+        patch.object(
+            ChaliceAccountResource, 'explain_sample_rate', 1, create=True
+        ),
+        patch(
+            'mongoengine.queryset.base.BaseQuerySet.explain',
+            return_value=EXPLAIN,
+        ),
+    ):
+        resp = chalice_client.get('/accounts')
+    assert resp.status_code == 200
+    [log_data] = extract_log_data(caplog.text)
+    assert log_data['request'] == dict(method='GET', path='/accounts')
+    assert log_data['explain']['stages'] == ['LIMIT', 'FETCH', 'IXSCAN']
+
+
+@pytest.mark.parametrize(
+    "client_fixture, resource",
+    [
+        ("fastapi_client", AccountResource),
+        ("chalice_client", ChaliceAccountResource),
+    ],
+)
+@pytest.mark.usefixtures('accounts')
+def test_query_explain_failure(
+    client_fixture: str, resource: type, request: pytest.FixtureRequest, caplog
+) -> None:
+    client = request.getfixturevalue(client_fixture)
+    with patch.object(resource, 'explain_sample_rate', 1, create=True):
+        resp = client.get('/accounts')
+    assert resp.status_code == 200
+    assert 'Unable to explain query' in caplog.text
+
+
+def test_query_lookups(fastapi_client: TestClient, cards: list[Card]) -> None:
+    resp = fastapi_client.get('/cards?page_size=2')
+    assert resp.status_code == 200
+    json_body = resp.json()
+    assert len(json_body['items']) == 2
+    assert json_body['total'] == len(cards)
+    resp = fastapi_client.get(json_body['next_page_uri'])
+    assert resp.json()['total'] == len(cards)
+    resp = fastapi_client.get('/cards?page_size=2&fields=user_id')
+    assert resp.json()['total'] == len(cards)
+    schema = fastapi_client.get('/openapi.json').json()
+    properties = schema['components']['schemas']['QueryResponseCard'][
+        'properties'
+    ]
+    assert properties['total']['anyOf'] == [
+        {'type': 'integer'},
+        {'type': 'null'},
+    ]
+
+
+@pytest.mark.usefixtures('cards')
+def test_query_lookups_run_concurrently(fastapi_client: TestClient) -> None:
+    lookup_started = asyncio.Event()
+
+    async def total(*_) -> int:
+        lookup_started.set()
+        return 42
+
+    async def async_to_list(query_set):
+        # only finishes if the lookup runs while the page is being fetched
+        await asyncio.wait_for(lookup_started.wait(), 2)
+        return list(query_set)
+
+    with (
+        patch.dict(CardResource.query_lookups, total=total),
+        patch.object(AsyncQuerySet, 'async_to_list', async_to_list),
+    ):
+        resp = fastapi_client.get('/cards')
+    assert resp.status_code == 200
+    assert resp.json()['total'] == 42
+
+
+@pytest.mark.usefixtures('cards')
+def test_rate_limit_query_costs(fastapi_client: TestClient) -> None:
+    limiter = RateLimiter(
+        rate=0.001, burst=10, costs=dict(count=10, item=0.01)
+    )
+    with patch.object(CardResource, 'rate_limit', limiter):
+        # 1 for the query and 0.01 for each of the 100 items
+        assert fastapi_client.get('/cards?page_size=100').status_code == 200
+        resp = fastapi_client.get('/cards?count=true')
+    assert resp.status_code == 429
+    assert resp.headers['retry-after'] == '2000'
+    assert resp.json() == dict(
+        error='Rate limit exceeded, retry in 2000 seconds'
+    )
+
+
+def test_rate_limit_by_api_key(fastapi_client: TestClient, card: Card) -> None:
+    limiter = RateLimiter(rate=0.001, burst=1)
+    with patch.object(CardResource, 'rate_limit', limiter):
+        assert fastapi_client.get(f'/cards/{card.id}').status_code == 200
+        assert fastapi_client.get(f'/cards/{card.id}').status_code == 429
+        with patch.object(
+            RestApiBlueprint, 'rate_limit_key', return_value='other-key'
+        ):
+            resp = fastapi_client.get(f'/cards/{card.id}')
+    assert resp.status_code == 200
+
+
+@pytest.mark.usefixtures('accounts')
+def test_chalice_rate_limit(chalice_client) -> None:
+    limiter = RateLimiter(rate=0.001, burst=1)
+    with patch.object(
+        ChaliceAccountResource, 'rate_limit', limiter, create=True
+    ):
+        assert chalice_client.get('/accounts').status_code == 200
+        resp = chalice_client.get('/accounts')
+    assert resp.status_code == 429
+    assert resp.json()['Code'] == 'TooManyRequestsError'
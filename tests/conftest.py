@@ -3,7 +3,7 @@ import functools
 import logging
 import os
 from functools import partial
-from typing import Callable, Generator
+from typing import Any, Callable, Generator
 
 import aiobotocore
 import boto3
@@ -14,7 +14,9 @@ from fastapi.testclient import TestClient as FastAPIClient
 from mongoengine import Document
 from typing_extensions import deprecated
 
+from agave.core.log_sink import log_sink
 from agave.tasks import sqs_tasks
+from examples.chalice.resources import Account as ChaliceAccount
 from examples.config import (
     TEST_DEFAULT_API_KEY_ID,
     TEST_DEFAULT_PLATFORM_ID,
@@ -22,6 +24,7 @@ from examples.config import (
     TEST_SECOND_PLATFORM_ID,
     TEST_SECOND_USER_ID,
 )
+from examples.fastapi.resources import Account as FastAPIAccount
 from examples.models import Account, Biller, Card, File, User
 
 from .utils import ChaliceClient
@@ -44,6 +47,15 @@ def collection_fixture(model: Document) -> Callable[..., FuncDecorator]:
     return collection_decorator
 
 
+@pytest.fixture(autouse=True)
+def clear_count_caches() -> Generator[None, None, None]:
+    yield
+    # `count_cache` is set by the blueprints when the resource is registered
+    resources: tuple[Any, ...] = (ChaliceAccount, FastAPIAccount)
+    for resource in resources:
+        resource.count_cache.clear()
+
+
 @pytest.fixture
 @collection_fixture(Account)
 def accounts() -> list[Account]:
@@ -291,3 +303,12 @@ def set_log_level(caplog):
     Automatically set logging level to INFO for all tests.
     """
     caplog.set_level(logging.INFO)
+
+
+@pytest.fixture(autouse=True)
+def synchronous_log_sink(monkeypatch: MonkeyPatch) -> None:
+    """
+    Writes the logs of the sink inline so they are in `caplog` right after
+    the request. The queue and the worker are tested in `test_log_sink`.
+    """
+    monkeypatch.setattr(log_sink, 'emit', log_sink.write)
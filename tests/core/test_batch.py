@@ -0,0 +1,16 @@
+import pytest
+
+from agave.core.batch import BATCH_MAX_IDS, parse_ids
+from agave.core.exc import UnprocessableEntity
+
+
+def test_parse_ids() -> None:
+    assert parse_ids(' AC2, AC1,AC2,, ') == ['AC2', 'AC1']
+
+
+@pytest.mark.parametrize(
+    'ids', [None, '', ' , ', ','.join(map(str, range(BATCH_MAX_IDS + 1)))]
+)
+def test_parse_invalid_ids(ids) -> None:
+    with pytest.raises(UnprocessableEntity):
+        parse_ids(ids)
@@ -0,0 +1,39 @@
+from unittest.mock import patch
+
+from mongoengine import Q
+
+from agave.core.counts import CountCache, can_estimate_count
+from examples.models import Account
+
+
+def test_count_cache_key_is_normalized() -> None:
+    assert CountCache.key(Account, Q(name='a') & Q(user_id='US1')) == (
+        CountCache.key(Account, Q(user_id='US1') & Q(name='a'))
+    )
+    assert CountCache.key(Account, Q(user_id='US1')) != (
+        CountCache.key(Account, Q(user_id='US2'))
+    )
+
+
+def test_count_cache_expires() -> None:
+    cache = CountCache(ttl=10)
+    with patch('agave.core.counts.time.monotonic', return_value=100):
+        cache.set('key', 5)
+        assert cache.get('key') == 5
+    with patch('agave.core.counts.time.monotonic', return_value=111):
+        assert cache.get('key') is None
+
+
+def test_count_cache_is_bounded() -> None:
+    cache = CountCache(ttl=10, max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('c', 3)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.get('c') == 3
+
+
+def test_can_estimate_count() -> None:
+    assert can_estimate_count(Account, Q())
+    assert not can_estimate_count(Account, Q(name='a'))
@@ -0,0 +1,74 @@
+import datetime as dt
+import json
+from decimal import Decimal
+from enum import Enum, IntEnum
+from typing import Generator
+from uuid import UUID
+
+import pytest
+from fastapi.responses import JSONResponse
+
+from agave.core import encoders
+
+
+class Status(str, Enum):
+    succeeded = 'succeeded'
+
+
+class Level(IntEnum):
+    high = 1
+
+
+VALUES = dict(
+    created_at=dt.datetime(2020, 1, 1, 12, 30, tzinfo=dt.timezone.utc),
+    naive=dt.datetime(2020, 1, 1, 12, 30, 0, 123),
+    date=dt.date(2020, 1, 1),
+    amount=Decimal('10.50'),
+    status=Status.succeeded,
+    level=Level.high,
+    uuid=UUID(int=1),
+    by_id={1: 'one'},
+    name='Sor Juana Inés',
+)
+
+
+@pytest.fixture(params=[encoders.JSON, encoders.ORJSON])
+def json_encoder(request) -> Generator[str, None, None]:
+    current = encoders.json_encoder
+    encoders.set_json_encoder(request.param)
+    yield request.param
+    encoders.set_json_encoder(current)
+
+
+def test_dumps_as_stdlib_json(json_encoder: str) -> None:
+    encoded = encoders.dumps(VALUES, default=str)
+    assert json.loads(encoded) == json.loads(json.dumps(VALUES, default=str))
+    assert json.loads(encoded)['created_at'] == '2020-01-01 12:30:00+00:00'
+    assert json.loads(encoded)['amount'] == '10.50'
+
+
+def test_dumps_without_default(json_encoder: str) -> None:
+    assert json.loads(encoders.dumps(dict(a=[1, 'b', None]))) == dict(
+        a=[1, 'b', None]
+    )
+    with pytest.raises(TypeError):
+        encoders.dumps(dict(amount=Decimal('1')))
+    with pytest.raises(TypeError):
+        encoders.dumps(dict(created_at=dt.datetime(2020, 1, 1)))
+
+
+def test_render_as_starlette(json_encoder: str) -> None:
+    content = dict(items=[dict(id='AC01', name='Sor Juana Inés')], count=1)
+    assert encoders.render(content) == JSONResponse(content).body
+
+
+def test_set_invalid_json_encoder() -> None:
+    with pytest.raises(ValueError):
+        encoders.set_json_encoder('ujson')
+
+
+def test_set_orjson_not_installed(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(encoders, 'orjson', None)
+    with pytest.raises(ImportError) as exc_info:
+        encoders.set_json_encoder(encoders.ORJSON)
+    assert 'pip install agave[orjson]' in str(exc_info.value)
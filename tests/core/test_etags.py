@@ -0,0 +1,27 @@
+import pytest
+
+from agave.core.etags import etag_matches, make_etag
+
+
+def test_make_etag() -> None:
+    etag = make_etag(dict(b=1, a=2), ['name'])
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag(dict(a=2, b=1), ['name'])
+    assert etag != make_etag(dict(a=2, b=1), None)
+
+
+@pytest.mark.parametrize(
+    'if_none_match, expected',
+    [
+        (None, False),
+        ('', False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"xyz", "abc"', True),
+        ('*', True),
+        ('"xyz"', False),
+        ('abc', False),
+    ],
+)
+def test_etag_matches(if_none_match, expected) -> None:
+    assert etag_matches(if_none_match, '"abc"') is expected
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+from agave.core.indexes import index_report, should_explain, summarize_explain
+from examples.models import Account, Card
+
+EXPLAIN = {
+    'queryPlanner': {
+        'winningPlan': {
+            'stage': 'LIMIT',
+            'inputStage': {
+                'stage': 'FETCH',
+                'inputStage': {
+                    'stage': 'IXSCAN',
+                    'indexName': 'user_id_1_created_at_-1__id_-1',
+                },
+            },
+        }
+    },
+    'executionStats': {
+        'nReturned': 3,
+        'totalKeysExamined': 3,
+        'totalDocsExamined': 3,
+        'executionTimeMillis': 1,
+    },
+}
+
+
+def test_index_report_with_indexes() -> None:
+    assert index_report(Card, ['user_id'], ('-created_at', '-pk')) == []
+    # the reversed direction of an index serves the sort too
+    assert index_report(Card, [], ('created_at', 'pk')) == []
+    assert index_report(Card, ['number', 'count'], ('-created_at',)) == [
+        'collection scan: no index starts with `number` '
+        '(optionally after the tenant fields)'
+    ]
+
+
+def test_index_report_without_indexes() -> None:
+    report = index_report(Account, ['name', 'user_id'], ('-created_at',))
+    assert report == [
+        'in-memory sort: no index on (-created_at) for queries without '
+        'tenant filters',
+        'in-memory sort: no index on (platform_id, -created_at) for queries '
+        'filtered by platform_id',
+        'in-memory sort: no index on (user_id, -created_at) for queries '
+        'filtered by user_id',
+        'in-memory sort: no index on (platform_id, user_id, -created_at) for '
+        'queries filtered by platform_id, user_id',
+        'collection scan: no index starts with `name` '
+        '(optionally after the tenant fields)',
+    ]
+
+
+def test_summarize_explain() -> None:
+    assert summarize_explain(EXPLAIN) == dict(
+        stages=['LIMIT', 'FETCH', 'IXSCAN'],
+        indexes=['user_id_1_created_at_-1__id_-1'],
+        collection_scan=False,
+        in_memory_sort=False,
+        returned=3,
+        keys_examined=3,
+        docs_examined=3,
+        time_ms=1,
+    )
+
+
+def test_should_explain() -> None:
+    assert not should_explain(None)
+    assert not should_explain(0)
+    with patch('agave.core.indexes.random.random', return_value=0.3):
+        assert should_explain(0.5)
+        assert not should_explain(0.2)
@@ -0,0 +1,95 @@
+import logging
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from agave.core.encoders import dumps
+from agave.core.log_sink import DROP_OLD, QueueLogSink
+
+from ..utils import extract_log_data
+
+logger = logging.getLogger('test_log_sink')
+
+
+def test_emit_writes_in_background(caplog) -> None:
+    sink = QueueLogSink()
+    sink.emit(logger, dict(request=dict(method='GET'), amount=10))
+    assert sink.flush(timeout=1)
+    assert extract_log_data(caplog.text) == [
+        dict(request=dict(method='GET'), amount=10)
+    ]
+    assert caplog.records[0].threadName == 'agave-log-sink'
+    assert sink.stats == dict(
+        enqueued=1, written=1, dropped=0, errors=0, pending=0
+    )
+
+
+def test_emit_skips_disabled_logger(caplog) -> None:
+    caplog.set_level(logging.WARNING, logger=logger.name)
+    sink = QueueLogSink()
+    sink.emit(logger, dict(foo='bar'))
+    assert sink.flush(timeout=1)
+    assert sink.stats['enqueued'] == 0
+    assert caplog.text == ''
+
+
+def _blocked_sink(overflow: str) -> tuple[QueueLogSink, threading.Event]:
+    """Sink of size 2 whose worker is blocked writing the first record"""
+    sink = QueueLogSink(max_size=2, overflow=overflow)
+    release = threading.Event()
+    writing = threading.Event()
+    write = sink.write
+
+    def blocked_write(log, data):
+        writing.set()
+        release.wait(1)
+        write(log, data)
+
+    sink.write = blocked_write  # type: ignore[method-assign]
+    sink.emit(logger, dict(n=0))
+    assert writing.wait(1)
+    return sink, release
+
+
+def test_overflow_drops_new_records(caplog) -> None:
+    sink, release = _blocked_sink('drop_new')
+    for n in range(1, 5):
+        sink.emit(logger, dict(n=n))
+    release.set()
+    assert sink.flush(timeout=1)
+    assert [d['n'] for d in extract_log_data(caplog.text)] == [0, 1, 2]
+    assert sink.dropped == 2
+
+
+def test_overflow_drops_old_records(caplog) -> None:
+    sink, release = _blocked_sink(DROP_OLD)
+    for n in range(1, 5):
+        sink.emit(logger, dict(n=n))
+    release.set()
+    assert sink.flush(timeout=1)
+    assert [d['n'] for d in extract_log_data(caplog.text)] == [0, 3, 4]
+    assert sink.dropped == 2
+
+
+def test_flush_timeout() -> None:
+    sink, release = _blocked_sink(DROP_OLD)
+    assert not sink.flush(timeout=0.01)
+    release.set()
+    assert sink.flush(timeout=1)
+
+
+def test_write_errors_are_counted() -> None:
+    sink = QueueLogSink()
+    log = MagicMock()
+    log.info.side_effect = [RuntimeError, None]
+    sink.write(log, dict(foo='bar'))
+    sink.write(log, dict(foo='bar'))
+    assert sink.errors == 1
+    assert sink.written == 1
+    log.info.assert_called_with(dumps(dict(foo='bar')))
+
+
+def test_invalid_overflow_policy() -> None:
+    with pytest.raises(ValueError):
+        QueueLogSink(overflow='block')
@@ -1,13 +1,20 @@
-from typing import Optional, Union
+from typing import Annotated, Optional, Union
 
 import pytest
 from cuenca_validations.types.general import LogConfig
 from pydantic import BaseModel
 
+from agave.core.encoders import dumps
 from agave.core.loggers import (
+    TRUNCATED_MARKER,
+    HeadersLogConfig,
     get_request_model,
     get_response_model,
+    get_sensitive_fields,
     obfuscate_sensitive_data,
+    route_log_setting,
+    sample_bodies,
+    truncate_body,
 )
 
 
@@ -87,3 +94,141 @@ def test_get_request_model_valid_types() -> None:
 
     assert request_model == [RequestModel]
     assert response_model == ResponseModel
+
+
+@pytest.mark.parametrize(
+    'value, expected',
+    [
+        (None, 1.0),
+        (0.5, 0.5),
+        (dict(query=0.1), 0.1),
+        (dict(create=0.1), 1.0),
+    ],
+)
+def test_route_log_setting(value, expected) -> None:
+    assert route_log_setting(value, 'query', 1.0) == expected
+
+
+@pytest.mark.parametrize(
+    'body, max_size, size, expected',
+    [
+        (dict(a='b'), None, None, (dict(a='b'), None)),
+        (None, 5, None, (None, None)),
+        (dict(a='b' * 10), 100, 200, (dict(a='b' * 10), None)),
+        (dict(a='b'), 10, 200, (dict(a='b'), None)),
+        (
+            dict(a='b' * 10),
+            5,
+            None,
+            (
+                dumps(dict(a='b' * 10))[:5] + TRUNCATED_MARKER,
+                f'truncated {len(dumps(dict(a="b" * 10))) - 5} of '
+                f'{len(dumps(dict(a="b" * 10)))} chars',
+            ),
+        ),
+    ],
+)
+def test_truncate_body(body, max_size, size, expected) -> None:
+    assert truncate_body(body, max_size, size) == expected
+
+
+def test_sample_bodies() -> None:
+    assert sample_bodies(1)
+    assert not sample_bodies(0)
+
+
+class Card(BaseModel):
+    number: Annotated[str, LogConfig(masked=True, unmasked_chars_length=4)]
+    cvv: Annotated[str, LogConfig(excluded=True)]
+
+
+class Transfer(BaseModel):
+    clabe: Annotated[str, LogConfig(masked=True)]
+
+
+class Owner(BaseModel):
+    name: str
+    card: Optional[Card] = None
+    cards: list[Card] = []
+    payment: Union[Card, Transfer, None] = None
+    referrer: Optional['Owner'] = None
+    tokens: Annotated[list[str], LogConfig(masked=True)] = []
+
+
+def test_get_sensitive_fields_nested() -> None:
+    plan = get_sensitive_fields(Owner)
+    card_plan = dict(
+        number=LogConfig(masked=True, unmasked_chars_length=4),
+        cvv=LogConfig(excluded=True),
+    )
+    assert plan['card'] == card_plan
+    assert plan['cards'] == card_plan
+    assert plan['payment'] == dict(**card_plan, clabe=LogConfig(masked=True))
+    assert plan['tokens'] == LogConfig(masked=True)
+    assert plan['referrer'] is get_sensitive_fields(Owner)['referrer']
+    assert plan['referrer']['card'] == card_plan
+    assert 'name' not in plan
+
+
+def test_obfuscate_nested() -> None:
+    card = dict(number='4111111111111111', cvv='123')
+    body = dict(
+        name='Frida',
+        card=card,
+        cards=[card, card],
+        payment=dict(clabe='646180157000000004'),
+        referrer=dict(name='Diego', referrer=dict(name='Sor', card=card)),
+        tokens=['abc', 'def'],
+    )
+    masked_card = dict(number='*****1111')
+    assert obfuscate_sensitive_data(body, get_sensitive_fields(Owner)) == (
+        dict(
+            name='Frida',
+            card=masked_card,
+            cards=[masked_card, masked_card],
+            payment=dict(clabe='*****'),
+            referrer=dict(
+                name='Diego', referrer=dict(name='Sor', card=masked_card)
+            ),
+            tokens=['*****', '*****'],
+        )
+    )
+    # the body is not modified
+    assert card == dict(number='4111111111111111', cvv='123')
+
+
+def test_obfuscate_without_sensitive_data_does_not_copy() -> None:
+    body = dict(name='Frida', card=None)
+    assert obfuscate_sensitive_data(body, get_sensitive_fields(Owner)) is body
+
+
+HEADERS = [
+    ('host', 'testserver'),
+    ('user-agent', 'testclient'),
+    ('authorization', 'Basic 123'),
+    ('x-cuenca-loginid', 'My-secret-login-id'),
+    ('content-length', '10'),
+]
+
+
+def test_headers_log_config_all_headers() -> None:
+    assert HeadersLogConfig()(HEADERS) == {
+        'host': 'testserver',
+        'user-agent': 'testclient',
+        'authorization': '*****',
+        'x-cuenca-loginid': '*****n-id',
+    }
+
+
+def test_headers_log_config_allow_list() -> None:
+    log_headers = HeadersLogConfig(
+        ['User-Agent', 'X-Cuenca-LoginId', 'Content-Length']
+    )
+    # excluded headers are never logged, even when allowed
+    assert log_headers.allow == {'user-agent', 'x-cuenca-loginid'}
+    assert log_headers(HEADERS) == {
+        'user-agent': 'testclient',
+        'x-cuenca-loginid': '*****n-id',
+    }
+    log_headers.configure(None)
+    assert 'host' in log_headers(HEADERS)
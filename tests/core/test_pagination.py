@@ -0,0 +1,41 @@
+import datetime as dt
+
+import pytest
+
+from agave.core.exc import UnprocessableEntity
+from agave.core.pagination import (
+    Cursor,
+    cursor_query,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+@pytest.mark.parametrize('limit', [None, 5])
+def test_encode_decode_cursor(limit) -> None:
+    cursor = Cursor(dt.datetime(2020, 1, 1, 12, 30, 15, 123000), 'CA1', limit)
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+
+
+@pytest.mark.parametrize(
+    'cursor', ['not-a-cursor', 'W10=', 'WzEsIDIsIDNd', 'WyIiLCAxLCAiYSJd']
+)
+def test_decode_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(UnprocessableEntity):
+        decode_cursor(cursor)
+
+
+def test_cursor_query() -> None:
+    created_at = dt.datetime(2020, 1, 1)
+    query = cursor_query(Cursor(created_at, 'CA123'))
+    assert query.to_query(None) == {
+        '$and': [
+            {'created_at': {'$lte': created_at}},
+            {
+                '$or': [
+                    {'created_at': {'$lt': created_at}},
+                    {'pk': {'$lt': 'CA123'}},
+                ]
+            },
+        ]
+    }
@@ -0,0 +1,62 @@
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel, Field
+
+from agave.core.exc import UnprocessableEntity
+from agave.core.projection import (
+    parse_fields,
+    project,
+    projection_fields,
+    serialize_projection,
+)
+from examples.models import Account, Jwt
+
+
+@pytest.mark.parametrize(
+    'fields, expected',
+    [
+        (None, None),
+        ('', None),
+        ('name', ['name']),
+        (' name , user_id,name ', ['name', 'user_id']),
+    ],
+)
+def test_parse_fields(fields, expected) -> None:
+    assert parse_fields(fields, ['id', 'name', 'user_id']) == expected
+
+
+def test_parse_invalid_fields() -> None:
+    with pytest.raises(UnprocessableEntity) as exc:
+        parse_fields('name,secret,other', ['id', 'name'])
+    assert exc.value.error == 'Invalid fields: other, secret'
+
+
+def test_projection_fields() -> None:
+    assert projection_fields(Account, ['id', 'name']) == [
+        'created_at',
+        'name',
+    ]
+    assert projection_fields(Jwt, ['id', 'created_at']) == ['created_at']
+    assert projection_fields(Account, ['id', 'name_uri']) is None
+
+
+def test_project() -> None:
+    item = dict(id='AC1', name='Frida', user_id='US1')
+    assert project(item, ['name', 'missing']) == dict(id='AC1', name='Frida')
+
+
+class Owner(BaseModel):
+    id: str
+    full_name: str = Field(serialization_alias='fullName')
+    nickname: Optional[str] = None
+
+
+def test_serialize_projection() -> None:
+    item = dict(id='US1', full_name='Frida Kahlo', nickname='Fri', age=47)
+    assert serialize_projection(Owner, item, ['fullName']) == dict(
+        id='US1', fullName='Frida Kahlo'
+    )
+    assert serialize_projection(Owner, dict(id='US1'), ['nickname']) == dict(
+        id='US1', nickname=None
+    )
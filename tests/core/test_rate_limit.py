@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+import pytest
+from cuenca_validations.types import QueryParams
+
+from agave.core.exc import TooManyRequests
+from agave.core.rate_limit import MemoryBackend, RateLimiter
+
+
+def test_memory_backend_refills() -> None:
+    backend = MemoryBackend()
+    with patch('agave.core.rate_limit.time.monotonic', return_value=100):
+        assert backend.take('key', 2, rate=1, burst=2) == 0
+        assert backend.take('key', 1, rate=1, burst=2) == 1
+        # other keys have their own bucket
+        assert backend.take('other', 1, rate=1, burst=2) == 0
+    with patch('agave.core.rate_limit.time.monotonic', return_value=101.5):
+        assert backend.take('key', 1, rate=1, burst=2) == 0
+        assert backend.take('key', 1, rate=1, burst=2) == 0.5
+
+
+def test_memory_backend_is_bounded() -> None:
+    backend = MemoryBackend(max_keys=2)
+    for key in ('a', 'b', 'c'):
+        backend.take(key, 1, rate=0.001, burst=1)
+    # `a` was dropped and starts full again
+    assert backend.take('a', 1, rate=0.001, burst=1) == 0
+    assert backend.take('c', 1, rate=0.001, burst=1) > 0
+
+
+def test_rate_limiter_cost() -> None:
+    limiter = RateLimiter(
+        rate=1, burst=20, costs=dict(count=10, create=5, item=0.1)
+    )
+    assert limiter.cost('retrieve') == 1
+    assert limiter.cost('create') == 5
+    assert limiter.cost('query', QueryParams(count=True, page_size=100)) == 10
+    assert limiter.cost('query', QueryParams(page_size=50)) == 6
+    assert limiter.cost('query', QueryParams(page_size=50, limit=10)) == 2
+    # never more than the bucket
+    limiter.costs['item'] = 1
+    assert limiter.cost('query', QueryParams(page_size=100)) == 20
+
+
+def test_rate_limiter_check() -> None:
+    limiter = RateLimiter(rate=0.5, burst=1)
+    limiter.check('AK01')
+    with pytest.raises(TooManyRequests) as exc_info:
+        limiter.check('AK01')
+    assert exc_info.value.retry_after == 2
+
+
+class AsyncBackend(MemoryBackend):
+    async def take(  # type: ignore[override]
+        self, key: str, cost: float, rate: float, burst: float
+    ) -> float:
+        return super().take(key, cost, rate, burst)
+
+
+async def test_rate_limiter_async_backend() -> None:
+    limiter = RateLimiter(rate=0.5, burst=1, backend=AsyncBackend())
+    await limiter.async_check('AK01')
+    with pytest.raises(TooManyRequests):
+        await limiter.async_check('AK01')
+    with pytest.raises(TypeError):
+        limiter.check('AK01')
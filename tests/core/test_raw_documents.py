@@ -0,0 +1,121 @@
+import datetime as dt
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+from mongoengine import (
+    BooleanField,
+    ComplexDateTimeField,
+    DateTimeField,
+    DecimalField,
+    DictField,
+    Document,
+    EmbeddedDocument,
+    EmbeddedDocumentField,
+    FloatField,
+    GenericLazyReferenceField,
+    IntField,
+    LazyReferenceField,
+    ListField,
+    StringField,
+)
+from mongoengine_plus.models import BaseModel
+from mongoengine_plus.types import EnumField
+
+from agave.core.raw_documents import raw_converter
+
+
+class Color(Enum):
+    red = 'red'
+
+
+class Owner(Document):
+    pass
+
+
+class Address(BaseModel, EmbeddedDocument):
+    street = StringField()
+    updated_at = DateTimeField()
+
+
+class Everything(BaseModel, Document):
+    _excluded = ['secret']
+    _hidden = ['pin']
+
+    id = StringField(primary_key=True)
+    name = StringField(db_field='n')
+    amount = IntField()
+    rate = FloatField()
+    active = BooleanField()
+    balance = DecimalField()
+    created_at = DateTimeField()
+    precise_at = ComplexDateTimeField()
+    color = EnumField(Color)
+    colors = ListField(EnumField(Color))
+    address = EmbeddedDocumentField(Address)
+    addresses = ListField(EmbeddedDocumentField(Address))
+    tags = ListField(StringField())
+    owner = LazyReferenceField(Owner)
+    owners = ListField(LazyReferenceField(Owner))
+    anything = GenericLazyReferenceField()
+    metadata = DictField()
+    secret = StringField()
+    pin = StringField()
+    status = StringField(default='created')
+
+
+@pytest.fixture
+def owner():
+    owner = Owner()
+    owner.save()
+    yield owner
+    owner.delete()
+
+
+@pytest.fixture
+def documents(owner: Owner):
+    documents = [
+        Everything(
+            id='EV01',
+            name='full',
+            amount=10,
+            rate=1.5,
+            active=True,
+            balance=Decimal('10.25'),
+            created_at=dt.datetime(2020, 1, 1),
+            precise_at=dt.datetime(2020, 1, 1, 0, 0, 0, 123),
+            color=Color.red,
+            colors=[Color.red],
+            address=Address(street='Reforma', updated_at=dt.datetime.now()),
+            addresses=[Address(street='Insurgentes')],
+            tags=['a', 'b'],
+            owner=owner,
+            owners=[owner],
+            anything=owner,
+            metadata=dict(key='value'),
+            secret='secret',
+            pin='1234',
+        ),
+        Everything(id='EV02'),
+    ]
+    for document in documents:
+        document.save()
+    # documents written before a field with default existed
+    Everything._get_collection().update_one(
+        {'_id': 'EV02'}, {'$unset': {'status': 1}}
+    )
+    yield documents
+    Everything.objects.delete()
+
+
+@pytest.mark.usefixtures('documents')
+def test_raw_converter_matches_to_dict() -> None:
+    convert = raw_converter(Everything)
+    raw_documents = {
+        raw['_id']: raw for raw in Everything.objects.as_pymongo()
+    }
+    for document in Everything.objects:
+        expected = document.to_dict()
+        item = convert(raw_documents[document.id])
+        assert item == expected
+        assert list(item) == list(expected)
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from agave.core.timing import (
+    RequestTimer,
+    TimingHistogram,
+    request_timer,
+    timed,
+    timed_call,
+)
+
+
+def test_timed_without_timer() -> None:
+    with timed('db'):
+        pass
+    assert request_timer.get() is None
+
+
+def test_timed_accumulates_phases() -> None:
+    timer = RequestTimer()
+    token = request_timer.set(timer)
+    try:
+        for _ in range(2):
+            with timed('db'):
+                time.sleep(0.001)
+        with timed('resource'):
+            pass
+    finally:
+        request_timer.reset(token)
+    timings = timer.as_dict()
+    assert set(timings) == {'db', 'resource', 'total'}
+    assert timings['db'] >= 2
+    assert timings['total'] >= timings['db']
+
+
+def test_timed_call() -> None:
+    def sync_func(value: int) -> int:
+        return value
+
+    async def async_func(value: int) -> int:
+        return value
+
+    timer = RequestTimer()
+    token = request_timer.set(timer)
+    try:
+        assert timed_call(sync_func, 'sync')(1) == 1
+        assert asyncio.run(timed_call(async_func, 'async')(2)) == 2
+    finally:
+        request_timer.reset(token)
+    assert set(timer.phases) == {'sync', 'async'}
+    assert timed_call(async_func, 'async').__name__ == 'async_func'
+
+
+def test_histogram() -> None:
+    histogram = TimingHistogram(buckets=(1, 10))
+    histogram.observe('GET', '/cards', dict(db=0.5, total=5))
+    histogram.observe('GET', '/cards', dict(db=20, total=30))
+    assert histogram.snapshot() == [
+        dict(
+            method='GET',
+            route='/cards',
+            phase='db',
+            buckets={'1': 1, '10': 0, '+Inf': 1},
+            count=2,
+            sum_ms=20.5,
+        ),
+        dict(
+            method='GET',
+            route='/cards',
+            phase='total',
+            buckets={'1': 0, '10': 1, '+Inf': 1},
+            count=2,
+            sum_ms=35,
+        ),
+    ]
+    metrics = histogram.to_prometheus()
+    labels = 'method="GET",route="/cards",phase="db"'
+    assert f'agave_request_phase_ms_bucket{{{labels},le="1"}} 1' in metrics
+    assert f'agave_request_phase_ms_bucket{{{labels},le="10"}} 1' in metrics
+    assert f'agave_request_phase_ms_bucket{{{labels},le="+Inf"}} 2' in metrics
+    assert f'agave_request_phase_ms_sum{{{labels}}} 20.5' in metrics
+    assert f'agave_request_phase_ms_count{{{labels}}} 2' in metrics
+    histogram.clear()
+    assert histogram.snapshot() == []
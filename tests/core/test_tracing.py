@@ -0,0 +1,33 @@
+import time
+
+from agave.core.tracing import (
+    TRACE_ID_ATTRIBUTE,
+    message_trace_id,
+    queue_wait_ms,
+    trace_attributes,
+    trace_id,
+)
+
+
+def test_trace_attributes() -> None:
+    assert trace_attributes() == {}
+    token = trace_id.set('TR01')
+    try:
+        attributes = trace_attributes()
+    finally:
+        trace_id.reset(token)
+    assert attributes == {
+        TRACE_ID_ATTRIBUTE: dict(DataType='String', StringValue='TR01')
+    }
+    assert message_trace_id(dict(MessageAttributes=attributes)) == 'TR01'
+    assert message_trace_id(dict()) is None
+
+
+def test_queue_wait_ms() -> None:
+    sent = int(time.time() * 1000) - 1500
+    wait = queue_wait_ms(dict(Attributes=dict(SentTimestamp=str(sent))))
+    assert wait is not None and 1500 <= wait < 2500
+    # clock skew
+    future = str(int(time.time() * 1000) + 10_000)
+    assert queue_wait_ms(dict(Attributes=dict(SentTimestamp=future))) == 0
+    assert queue_wait_ms(dict(Attributes={})) is None
@@ -0,0 +1,86 @@
+import asyncio
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from agave.fastapi.middlewares import (
+    AdmissionController,
+    AdmissionLimit,
+    AdmissionMiddleware,
+    AgaveErrorHandler,
+)
+from agave.fastapi.middlewares.admission import AdmissionGate
+
+
+async def test_admission_gate_queue() -> None:
+    gate = AdmissionGate(AdmissionLimit(1, max_queued=1, queue_timeout=1))
+    assert await gate.acquire()
+    waiting = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    assert gate.queued == 1
+    # the queue is full
+    assert not await gate.acquire()
+    gate.release()
+    assert await waiting
+    assert (gate.in_flight, gate.queued, gate.rejected) == (1, 0, 1)
+
+
+async def test_admission_gate_queue_timeout() -> None:
+    gate = AdmissionGate(AdmissionLimit(1, max_queued=1, queue_timeout=0.01))
+    assert await gate.acquire()
+    assert not await gate.acquire()
+    assert (gate.in_flight, gate.queued, gate.rejected) == (1, 0, 1)
+    gate.release()
+    assert await gate.acquire()
+
+
+async def test_admission_middleware() -> None:
+    controller = AdmissionController(
+        AdmissionLimit(1), groups=dict(files=AdmissionLimit(1)), retry_after=5
+    )
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    app.add_middleware(AgaveErrorHandler)
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    @app.get('/accounts')
+    async def slow() -> dict:
+        started.set()
+        await finish.wait()
+        return dict(ok=True)
+
+    @app.get('/files')
+    async def files() -> dict:
+        return dict(ok=True)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url='http://test') as c:
+        slow_request = asyncio.create_task(c.get('/accounts'))
+        await started.wait()
+        assert controller.stats() == dict(
+            default=dict(in_flight=1, queued=0, rejected=0)
+        )
+        shed = await c.get('/accounts')
+        # other groups have their own slots
+        assert (await c.get('/files')).status_code == 200
+        finish.set()
+        assert (await slow_request).status_code == 200
+
+    assert shed.status_code == 503
+    assert shed.headers['retry-after'] == '5'
+    assert shed.json() == dict(error='Service overloaded, try again later')
+    assert controller.stats() == dict(
+        default=dict(in_flight=0, queued=0, rejected=1),
+        files=dict(in_flight=0, queued=0, rejected=0),
+    )
+    assert controller.to_prometheus().splitlines() == [
+        '# TYPE agave_admission_in_flight gauge',
+        'agave_admission_in_flight{group="default"} 0',
+        'agave_admission_in_flight{group="files"} 0',
+        '# TYPE agave_admission_queued gauge',
+        'agave_admission_queued{group="default"} 0',
+        'agave_admission_queued{group="files"} 0',
+        '# TYPE agave_admission_rejected counter',
+        'agave_admission_rejected{group="default"} 1',
+        'agave_admission_rejected{group="files"} 0',
+    ]
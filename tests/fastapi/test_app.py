@@ -1,9 +1,24 @@
-from unittest.mock import AsyncMock
+import re
+from typing import Optional
+from unittest.mock import AsyncMock, patch
 
+import pytest
 from _pytest.monkeypatch import MonkeyPatch
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
-
-from agave.core.exc import UnauthorizedError
+from starlette.routing import BaseRoute, Match, Mount, Route
+
+from agave.core.exc import (
+    MethodNotAllowedError,
+    NotFoundError,
+    UnauthorizedError,
+)
+from agave.fastapi.middlewares import AgaveErrorHandler, error_handlers
+from agave.fastapi.middlewares.error_handlers import (
+    RouteIndex,
+    get_route_index,
+)
+from examples.fastapi.app import app as example_app
 from examples.fastapi.middlewares.authed import AuthedMiddleware
 
 
@@ -57,3 +72,90 @@ def test_get_ip_with_empty_x_forwarded(fastapi_client: TestClient) -> None:
     resp = fastapi_client.get('/get_ip', headers={'X-Forwarded-For': ''})
     assert resp.status_code == 200
     assert resp.json() == 'testclient'
+
+
+async def test_error_handler_ignores_non_http_scopes() -> None:
+    app = AsyncMock()
+    scope = dict(type='lifespan')
+    receive, send = AsyncMock(), AsyncMock()
+    await AgaveErrorHandler(app)(scope, receive, send)
+    app.assert_awaited_once_with(scope, receive, send)
+
+
+async def test_error_handler_after_response_started() -> None:
+    async def app(scope, receive, send) -> None:
+        await send({'type': 'http.response.start', 'status': 200})
+        raise UnauthorizedError('too late')
+
+    scope = dict(type='http', app=FastAPI(), method='GET', path='/')
+    send = AsyncMock()
+    with patch.object(error_handlers, 'get_current_route_handler'):
+        with pytest.raises(UnauthorizedError):
+            await AgaveErrorHandler(app)(scope, AsyncMock(), send)
+    # the status was already sent, the error can only be raised
+    send.assert_awaited_once()
+
+
+def route_scope(method: str, path: str) -> dict:
+    return dict(type='http', method=method, path=path, root_path='')
+
+
+def linear_scan(app: FastAPI, scope: dict) -> Optional[BaseRoute]:
+    return next(
+        (r for r in app.routes if r.matches(scope)[0] == Match.FULL), None
+    )
+
+
+def test_route_index_matches_linear_scan() -> None:
+    index = RouteIndex(example_app.routes)
+    for route in example_app.routes:
+        assert isinstance(route, Route)
+        path = re.sub(r'{[^}]+}', 'AC01', route.path)
+        for method in route.methods or ['GET']:
+            scope = route_scope(method, path)
+            assert index.resolve(scope) is linear_scan(example_app, scope)
+
+
+def test_route_index_keeps_route_order() -> None:
+    app = FastAPI()
+
+    @app.get('/{kind}')
+    def by_kind(kind: str) -> dict:
+        return dict(kind=kind)
+
+    @app.get('/accounts')
+    def accounts() -> dict:
+        return dict()
+
+    @app.post('/accounts')
+    def create_account() -> dict:
+        return dict()
+
+    app.mount('/static', FastAPI())
+    index = RouteIndex(app.routes)
+
+    def resolved_path(method: str, path: str) -> str:
+        route = index.resolve(route_scope(method, path))
+        assert isinstance(route, (Route, Mount))
+        return route.path
+
+    assert resolved_path('GET', '/accounts') == '/{kind}'
+    assert resolved_path('POST', '/accounts') == '/accounts'
+    assert resolved_path('PUT', '/static/a.css') == '/static'
+    with pytest.raises(MethodNotAllowedError):
+        index.resolve(route_scope('DELETE', '/accounts'))
+    with pytest.raises(NotFoundError):
+        index.resolve(route_scope('GET', '/accounts/AC01'))
+
+
+def test_route_index_rebuilt_when_routes_change() -> None:
+    app = FastAPI()
+    index = get_route_index(app)
+    assert get_route_index(app) is index
+
+    @app.get('/cards')
+    def cards() -> dict:
+        return dict()
+
+    assert get_route_index(app) is not index
+    assert get_route_index(app).resolve(route_scope('GET', '/cards'))
@@ -0,0 +1,40 @@
+import pytest
+from starlette_context import _request_scope_context_storage
+from starlette_context.errors import ContextDoesNotExistError
+
+from agave.fastapi import RequestContext, request_context
+from agave.fastapi.context import get_request_context, use_request_context
+from examples.fastapi.blueprints.custom_query_blueprint import (
+    CustomQueryBlueprint,
+)
+
+
+def test_request_context() -> None:
+    context = RequestContext(user_id='US01', extra=dict(custom='CU01'))
+    with use_request_context(context):
+        assert get_request_context() is context
+        blueprint = CustomQueryBlueprint()
+        assert blueprint.current_user_id == 'US01'
+        assert blueprint.current_platform_id is None
+        assert blueprint.custom == 'CU01'
+        assert not blueprint.property_filter_required()
+    assert request_context.get() is None
+
+
+def test_request_context_outside_of_request() -> None:
+    with pytest.raises(ContextDoesNotExistError):
+        get_request_context()
+
+
+def test_request_context_from_starlette_context() -> None:
+    token = _request_scope_context_storage.set(
+        dict(user_id='US01', user_id_filter_required=True, custom='CU01')
+    )
+    try:
+        context = get_request_context()
+    finally:
+        _request_scope_context_storage.reset(token)
+    assert context.user_id == 'US01'
+    assert context.user_id_filter_required
+    assert not context.platform_id_filter_required
+    assert context.extra['custom'] == 'CU01'
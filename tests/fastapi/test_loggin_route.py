@@ -2,12 +2,28 @@ import ast
 import json
 import logging
 from tempfile import TemporaryFile
+from typing import Any, Optional
+from unittest.mock import patch
 
 import pytest
+from fastapi import File as FastAPIFile, Request, Response, UploadFile
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
 
-from examples.models import Account
-
+from agave.core import timing
+from agave.core.encoders import dumps
+from agave.core.loggers import TRUNCATED_MARKER, set_log_headers
+from agave.fastapi.middlewares.loggin_route import (
+    LoggingRoute,
+    response_content,
+)
+from agave.fastapi.middlewares.utils import is_json_content
+from agave.fastapi.responses import AgaveJSONResponse
+from examples.fastapi.app import app
+from examples.fastapi.resources.accounts import Account as AccountResource
+from examples.models import Account, File
+
+from ..core.test_indexes import EXPLAIN
 from ..utils import extract_log_data
 
 
@@ -194,6 +210,34 @@ def test_logger_headers_case_insensitive(
     assert log_data[0]['request']['headers'] == expected_log_headers
 
 
+def test_logger_trace_id(fastapi_client: TestClient, caplog) -> None:
+    fastapi_client.get('/accounts', headers={'X-Request-Id': 'RQ01'})
+    fastapi_client.get('/accounts')
+    traced, generated = extract_log_data(caplog.text)
+    assert traced['trace_id'] == 'RQ01'
+    assert generated['trace_id'] not in (None, 'RQ01')
+
+
+def test_logger_headers_allow_list(fastapi_client: TestClient, caplog) -> None:
+    set_log_headers()
+    try:
+        response = fastapi_client.get(
+            '/accounts',
+            headers={'X-Request-Id': 'RQ01', 'Authorization': '123'},
+        )
+    finally:
+        set_log_headers(None)
+    assert response.status_code == 200
+    log_data = extract_log_data(caplog.text)[0]
+    assert log_data['request']['headers'] == {
+        'user-agent': 'testclient',
+        'x-request-id': 'RQ01',
+    }
+    assert log_data['response']['headers'] == {
+        'content-type': 'application/json'
+    }
+
+
 def test_logger_api_route(fastapi_client: TestClient, caplog) -> None:
     """
     Test that verifies the logger properly masks sensitive data in:
@@ -264,6 +308,16 @@ def test_logger_api_route(fastapi_client: TestClient, caplog) -> None:
     log_output = caplog.text
     log_data = extract_log_data(log_output)
 
+    assert len(log_data[0].pop('trace_id')) == 32
+    timings = log_data[0].pop('timings')
+    assert set(timings) == {
+        'read_body',
+        'resource',
+        'serialize',
+        'handler',
+        'log',
+        'total',
+    }
     assert log_data[0] == expected_log
 
 
@@ -319,3 +373,258 @@ def test_logger_unauthorized(fastapi_client: TestClient, caplog) -> None:
     assert request_data == log_data[0]['request']['body']
     assert response.status_code == log_data[0]['response']['status_code']
     assert response.json()['error'] == log_data[0]['response']['error']
+
+
+@pytest.mark.usefixtures('accounts')
+def test_logger_query_explain(fastapi_client: TestClient, caplog) -> None:
+    caplog.set_level(logging.INFO)
+    with (
+        patch.object(AccountResource, 'explain_sample_rate', 1, create=True),
+        patch(
+            'mongoengine.queryset.base.BaseQuerySet.explain',
+            return_value=EXPLAIN,
+        ),
+    ):
+        response = fastapi_client.get('/accounts')
+    assert response.status_code == 200
+    log_data = extract_log_data(caplog.text)
+    assert log_data[-1]['explain']['indexes'] == [
+        'user_id_1_created_at_-1__id_-1'
+    ]
+    assert log_data[-1]['request']['url'].endswith('/accounts')
+
+
+@pytest.mark.usefixtures('accounts')
+def test_logger_query_without_explain(
+    fastapi_client: TestClient, caplog
+) -> None:
+    caplog.set_level(logging.INFO)
+    response = fastapi_client.get('/accounts')
+    assert response.status_code == 200
+    assert 'explain' not in extract_log_data(caplog.text)[-1]
+
+
+def test_logger_skips_non_json_request_body(
+    fastapi_client: TestClient, caplog
+) -> None:
+    with patch('starlette.requests.Request.json') as request_json:
+        response = fastapi_client.post(
+            '/token',
+            content=b'{"some_field": "some value"}',
+            headers={'Content-Type': 'text/plain'},
+        )
+    request_json.assert_not_called()
+    assert response.status_code == 201
+    assert extract_log_data(caplog.text)[0]['request']['body'] is None
+
+
+def test_logger_reuses_response_content(
+    fastapi_client: TestClient, account: Account, caplog
+) -> None:
+    with patch(
+        'agave.fastapi.middlewares.loggin_route.json.loads'
+    ) as json_loads:
+        response = fastapi_client.get(f'/accounts/{account.id}')
+    json_loads.assert_not_called()
+    assert response.status_code == 200
+    log_data = extract_log_data(caplog.text)
+    assert log_data[0]['response']['body']['name'] == '*****Kahlo'
+
+
+@pytest.mark.parametrize(
+    'response, content',
+    [
+        (AgaveJSONResponse(content=dict(id='AC01')), dict(id='AC01')),
+        (JSONResponse(content=dict(id='AC01')), dict(id='AC01')),
+        (Response(content=b'%PDF-1.4', media_type='application/pdf'), None),
+        (Response(content=b'{}'), None),
+        (Response(status_code=304), None),
+    ],
+)
+def test_response_content(response: Response, content: Any) -> None:
+    assert response_content(response) == content
+
+
+@pytest.mark.parametrize(
+    'content_type, expected',
+    [
+        (None, True),
+        ('application/json', True),
+        ('application/json; charset=utf-8', True),
+        ('application/merge-patch+json', True),
+        ('multipart/form-data; boundary=xyz', False),
+        ('text/plain', False),
+    ],
+)
+def test_is_json_content(content_type: Optional[str], expected: bool) -> None:
+    assert is_json_content(content_type) is expected
+
+
+def card_endpoint(name: str) -> Any:
+    return next(
+        route.endpoint
+        for route in app.routes
+        if isinstance(route, LoggingRoute)
+        and route.name == name
+        and route.path.startswith('/cards')
+    )
+
+
+def test_resource_log_settings() -> None:
+    assert card_endpoint('query').log_sample_rate == 0.1
+    assert card_endpoint('retrieve').log_sample_rate == 1.0
+    assert card_endpoint('query').log_max_body_size == 10_000
+    assert card_endpoint('retrieve').log_max_body_size == 10_000
+    accounts: Any = next(
+        route.endpoint
+        for route in app.routes
+        if isinstance(route, LoggingRoute) and route.path == '/accounts'
+    )
+    assert accounts.log_sample_rate == 1.0
+    assert accounts.log_max_body_size is None
+
+
+@pytest.mark.usefixtures('cards')
+def test_logger_sampled_out(fastapi_client: TestClient, caplog) -> None:
+    with patch.object(card_endpoint('query'), 'log_sample_rate', 0):
+        response = fastapi_client.get('/cards')
+    assert response.status_code == 200
+    [log_data] = extract_log_data(caplog.text)
+    assert log_data['response']['status_code'] == 200
+    assert log_data['request']['body'] is None
+    assert log_data['response']['body'] is None
+    assert log_data['skipped'] == {
+        'request.body': 'sampled out',
+        'response.body': 'sampled out',
+    }
+
+
+def test_logger_errors_are_not_sampled(
+    fastapi_client: TestClient, caplog
+) -> None:
+    with patch.object(card_endpoint('retrieve'), 'log_sample_rate', 0):
+        response = fastapi_client.get('/cards/CA404')
+    assert response.status_code == 404
+    log_data = extract_log_data(caplog.text)[-1]
+    assert log_data['response']['status_code'] == 404
+    assert 'skipped' not in log_data
+
+
+@pytest.mark.usefixtures('cards')
+def test_logger_truncates_bodies(fastapi_client: TestClient, caplog) -> None:
+    with patch.object(card_endpoint('query'), 'log_sample_rate', 1):
+        response = fastapi_client.get('/cards')
+        with patch.object(card_endpoint('query'), 'log_max_body_size', 50):
+            fastapi_client.get('/cards')
+    full, truncated = extract_log_data(caplog.text)
+    assert full['response']['body'] == response.json()
+    assert 'skipped' not in full
+    body = truncated['response']['body']
+    assert body == dumps(response.json())[:50] + TRUNCATED_MARKER
+    size = len(dumps(response.json()))
+    assert truncated['skipped'] == {
+        'response.body': f'truncated {size - 50} of {size} chars'
+    }
+
+
+@pytest.mark.usefixtures('accounts')
+def test_logger_query_masks_items(fastapi_client: TestClient, caplog) -> None:
+    response = fastapi_client.get('/accounts')
+    assert response.status_code == 200
+    names = [item['name'] for item in response.json()['items']]
+    log_data = extract_log_data(caplog.text)[-1]
+    logged = [item['name'] for item in log_data['response']['body']['items']]
+    assert logged == [f'*****{name[-5:]}' for name in names]
+
+
+def test_logger_timings(
+    fastapi_client: TestClient, account: Account, caplog
+) -> None:
+    response = fastapi_client.get(f'/accounts/{account.id}')
+    assert response.status_code == 200
+    timings = extract_log_data(caplog.text)[-1]['timings']
+    assert set(timings) == {
+        'read_body',
+        'db',
+        'serialize',
+        'handler',
+        'log',
+        'total',
+    }
+    assert timings['handler'] >= timings['db']
+    assert timings['total'] >= timings['handler']
+
+
+def test_logger_timing_histogram(
+    fastapi_client: TestClient, account: Account
+) -> None:
+    histogram = timing.enable_timing_histogram()
+    try:
+        fastapi_client.get(f'/accounts/{account.id}')
+        fastapi_client.get(f'/accounts/{account.id}')
+    finally:
+        timing.disable_timing_histogram()
+    fastapi_client.get(f'/accounts/{account.id}')
+    series = {
+        s['phase']: s
+        for s in histogram.snapshot()
+        if s['route'] == '/accounts/{id}'
+    }
+    assert series['db']['method'] == 'GET'
+    assert series['db']['count'] == 2
+    assert series['total']['count'] == 2
+
+
+def test_logger_upload_metadata(fastapi_client: TestClient, caplog) -> None:
+    content = b'%PDF-1.4' * 1000
+    with patch.object(Request, 'body', side_effect=AssertionError):
+        response = fastapi_client.post(
+            '/files',
+            files=dict(
+                file=('report.pdf', content, 'application/pdf'),
+                file_name=(None, 'report.pdf'),
+            ),
+        )
+    # `FileUploadValidator.file` takes bytes, not a file with a filename.
+    # The form is parsed before that
+    assert response.status_code == 400
+    request_log = extract_log_data(caplog.text)[-1]['request']
+    assert request_log['body'] is None
+    stream = request_log['stream']
+    assert stream['content_type'].startswith('multipart/form-data')
+    assert stream['size'] > len(content)
+    assert stream['files'] == [
+        dict(
+            field='file',
+            filename='report.pdf',
+            content_type='application/pdf',
+            size=len(content),
+        )
+    ]
+
+
+def test_logger_download_metadata(
+    fastapi_client: TestClient, file: File, caplog
+) -> None:
+    response = fastapi_client.get(
+        f'/files/{file.id}', headers={'Accept': 'application/pdf'}
+    )
+    assert response.status_code == 200
+    response_log = extract_log_data(caplog.text)[-1]['response']
+    assert response_log['body'] is None
+    assert response_log['stream'] == dict(
+        content_type='application/pdf',
+        size=None,
+        filename=response.headers['content-disposition'].split('=')[1],
+    )
+
+
+def test_logging_route_detects_form_bodies() -> None:
+    async def upload(file: UploadFile = FastAPIFile(...)) -> None:
+        return None
+
+    async def create(account: dict) -> None:
+        return None
+
+    assert LoggingRoute('/upload', upload, methods=['POST']).form_body
+    assert not LoggingRoute('/create', create, methods=['POST']).form_body
@@ -5,8 +5,12 @@ from unittest.mock import AsyncMock, call
 from cuenca_validations.types import LogConfig
 from pydantic import BaseModel
 
+from agave.core.encoders import dumps
 from agave.core.exc import RetryTask
+from agave.core.loggers import TRUNCATED_MARKER
+from agave.core.tracing import trace_id
 from agave.tasks.sqs_tasks import task
+from agave.tools.asyncio.sqs_client import SqsClient
 
 from ..utils import CORE_QUEUE_REGION, extract_log_data
 
@@ -310,3 +314,103 @@ async def test_task_with_exception_logger(sqs_client, caplog) -> None:
 
     assert log_data[0]['response']['status'] == 'failed'
     assert log_data[0]['response']['error'] == 'test_exception'
+
+
+async def test_task_log_sampling(sqs_client, caplog) -> None:
+    for status in ('ok', 'fail'):
+        await sqs_client.send_message(
+            MessageBody=json.dumps(dict(status=status)),
+            MessageGroupId='1234',
+        )
+
+    async def my_task(data: dict) -> dict:
+        if data['status'] == 'fail':
+            raise Exception('test_exception')
+        return dict(response='my_custom_response')
+
+    await task(
+        queue_url=sqs_client.queue_url,
+        region_name=CORE_QUEUE_REGION,
+        wait_time_seconds=1,
+        visibility_timeout=1,
+        log_sample_rate=0,
+    )(my_task)()
+
+    failed, success = sorted(
+        extract_log_data(caplog.text),
+        key=lambda log: log['response']['status'],
+    )
+    assert failed['response']['status'] == 'failed'
+    assert failed['request']['body'] == dict(status='fail')
+    assert 'skipped' not in failed
+    assert success['response']['status'] == 'success'
+    assert success['request']['body'] is None
+    assert success['response']['body'] is None
+    assert success['skipped'] == {
+        'request.body': 'sampled out',
+        'response.body': 'sampled out',
+    }
+
+
+async def test_task_log_max_body_size(sqs_client, caplog) -> None:
+    test_message = dict(foo='bar' * 10)
+    await sqs_client.send_message(
+        MessageBody=json.dumps(test_message),
+        MessageGroupId='1234',
+    )
+
+    async def my_task(data: dict) -> dict:
+        return dict(ok=True)
+
+    await task(
+        queue_url=sqs_client.queue_url,
+        region_name=CORE_QUEUE_REGION,
+        wait_time_seconds=1,
+        visibility_timeout=1,
+        log_max_body_size=20,
+    )(my_task)()
+
+    [log_data] = extract_log_data(caplog.text)
+    encoded = dumps(test_message)
+    assert log_data['request']['body'] == encoded[:20] + TRUNCATED_MARKER
+    assert log_data['response']['body'] == dict(ok=True)
+    cut = len(encoded) - 20
+    assert log_data['skipped'] == {
+        'request.body': f'truncated {cut} of {len(encoded)} chars'
+    }
+
+
+async def test_task_trace_id_and_queue_wait(sqs_client, caplog) -> None:
+    token = trace_id.set('TR01')
+    try:
+        async with SqsClient(sqs_client.queue_url, CORE_QUEUE_REGION) as sqs:
+            await sqs.send_message(dict(traced=True))
+    finally:
+        trace_id.reset(token)
+    await sqs_client.send_message(
+        MessageBody=json.dumps(dict(traced=False)),
+        MessageGroupId='1234',
+    )
+    task_trace_ids = []
+
+    async def my_task(data: dict) -> None:
+        task_trace_ids.append(trace_id.get())
+
+    await task(
+        queue_url=sqs_client.queue_url,
+        region_name=CORE_QUEUE_REGION,
+        wait_time_seconds=1,
+        visibility_timeout=1,
+    )(my_task)()
+
+    traced, untraced = sorted(
+        extract_log_data(caplog.text),
+        key=lambda log: not log['request']['body']['traced'],
+    )
+    assert traced['trace_id'] == 'TR01'
+    # messages sent without a trace start a new one
+    assert untraced['trace_id'] not in (None, 'TR01')
+    assert set(task_trace_ids) == {traced['trace_id'], untraced['trace_id']}
+    for log_data in (traced, untraced):
+        assert log_data['request']['queue_wait_ms'] >= 0
+    assert trace_id.get() is None
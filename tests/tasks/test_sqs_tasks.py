@@ -2,17 +2,19 @@ import asyncio
 import datetime as dt
 import json
 import uuid
-from typing import Union
+from typing import Annotated, Union
 from unittest.mock import AsyncMock, call, patch
 
 import aiobotocore.client
 from aiobotocore.httpsession import HTTPClientError
+from cuenca_validations.types import LogConfig
 from pydantic import BaseModel
 
 from agave.core.exc import RetryTask
 from agave.tasks.sqs_tasks import (
     BACKGROUND_TASKS,
     get_running_fast_agave_tasks,
+    get_task_metadata,
     task,
 )
 
@@ -427,3 +429,55 @@ async def test_invalid_json_message(sqs_client) -> None:
     resp = await sqs_client.receive_message()
     assert 'Messages' not in resp
     assert len(BACKGROUND_TASKS) == 0
+
+
+async def test_task_metadata_is_resolved_once(sqs_client) -> None:
+    class Validator(BaseModel):
+        id: str
+
+    for id in ('abc123', 'def456', 'ghi789'):
+        await sqs_client.send_message(
+            MessageBody=json.dumps(dict(id=id)),
+            MessageGroupId='1234',
+        )
+    async_mock_function = AsyncMock(return_value=None)
+
+    async def my_task(data: Validator) -> None:
+        await async_mock_function(data)
+
+    with patch(
+        'agave.tasks.sqs_tasks.get_task_metadata',
+        wraps=get_task_metadata,
+    ) as get_metadata:
+        start_task = task(
+            queue_url=sqs_client.queue_url,
+            region_name=CORE_QUEUE_REGION,
+            wait_time_seconds=1,
+            visibility_timeout=1,
+        )(my_task)
+        await start_task()
+    get_metadata.assert_called_once_with(my_task)
+    assert async_mock_function.call_count == 3
+    async_mock_function.assert_called_with(Validator(id='ghi789'))
+
+
+def test_get_task_metadata() -> None:
+    class Request(BaseModel):
+        id: str
+        secret: Annotated[str, LogConfig(excluded=True)]
+
+    class Response(BaseModel):
+        token: Annotated[str, LogConfig(masked=True)]
+
+    async def my_task(data: Request) -> Response:
+        return Response(token=data.id)
+
+    metadata = get_task_metadata(my_task)
+    assert metadata.name == 'my_task'
+    assert metadata.module == __name__
+    assert metadata.request_log_config_fields == dict(
+        secret=LogConfig(excluded=True)
+    )
+    assert metadata.response_log_config_fields == dict(
+        token=LogConfig(masked=True)
+    )
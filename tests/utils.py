@@ -1,11 +1,33 @@
 import json
 import re
+import signal
+from contextlib import contextmanager
+from typing import Generator
 
 from chalice.test import Client as OriginalChaliceClient
 
 CORE_QUEUE_REGION = 'us-east-1'
 
 
+@contextmanager
+def timeout(seconds: int) -> Generator[None, None, None]:
+    """
+    Fails the test instead of blocking the whole suite when the wrapped
+    block does not finish in time.
+    """
+
+    def handler(*_) -> None:
+        raise TimeoutError(f'Timed out after {seconds} seconds')
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.alarm(seconds)
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
 def extract_log_data(log_output: str) -> list[dict]:
     """
     Extracts JSON data from log output using a regex